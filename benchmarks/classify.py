@@ -0,0 +1,125 @@
+"""Throughput of the CPC/IPC focus-area classifier (utils/classifier.py) on synthetic classification rows.
+
+    python benchmarks/classify.py --rows 10000000
+    python benchmarks/classify.py --rows 1000000 --check
+
+Rows look like PATSTAT's tls224_appln_cpc (appln_id, cpc_class_symbol with space padded
+groups), about three classes per application. A third of the distinct symbols fall under an
+entry of the class list, the rest are random. Reported per step, in rows/s:
+
+    classify    factorizing the rows, normalizing and labeling the symbols, combining per application
+    relabel     labeling the same rows again after a change to the class list
+
+--check compares the labels of every distinct symbol with a plain startswith loop.
+"""
+import argparse
+import resource
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.classifier import CLASS_AREAS, CLASSES_PATH, CLASSES_SHEET, ClassIndex, Classification, normalize_symbols
+from utils.compact import AREA_BITS
+
+CLASSES_PER_APPLICATION = 3
+MATCHING_SHARE = 1 / 3
+SECTIONS = list("ABCDEFGHY")
+
+
+def random_symbols(rng, n) -> np.ndarray:
+    subclass = [f"{s}{c:02d}{l}" for s, c, l in zip(rng.choice(SECTIONS, n), rng.integers(1, 100, n), rng.choice(list("ABCDFGHJKLMNPQ"), n))]
+    group, subgroup = rng.integers(1, 2200, n), rng.integers(0, 1000, n)
+    return np.array([f"{s}{g:4d}/{sg:02d}" for s, g, sg in zip(subclass, group, subgroup)])
+
+
+def matching_symbols(rng, classes, n) -> np.ndarray:
+    # Entries of the class list completed down to a subgroup
+    entries = normalize_symbols(pd.concat([classes[col].dropna() for col in CLASS_AREAS if col in classes.columns])).to_numpy()
+    symbols = []
+    for entry, extra in zip(rng.choice(entries, n), rng.integers(0, 100, n)):
+        if len(entry) <= 4:
+            entry = f"{entry}A" if len(entry) == 3 else entry
+            symbols.append(f"{entry}{extra + 1:4d}/00")
+        elif "/" not in entry:
+            symbols.append(f"{entry[:4]}{int(entry[4:]):4d}/{extra:02d}")
+        else:
+            group, subgroup = entry[4:].split("/")
+            symbols.append(f"{entry[:4]}{int(group):4d}/{subgroup}{extra % 10}")
+    return np.array(symbols)
+
+
+def generate(rows, distinct, classes, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    matching = int(distinct * MATCHING_SHARE)
+    universe = rng.permutation(pd.unique(np.concatenate([matching_symbols(rng, classes, matching), random_symbols(rng, distinct - matching)])))
+    # A few classes are used by many applications. The symbols come as a categorical, like
+    # extracts read through utils.data_loader.
+    symbol = (rng.zipf(1.3, rows) - 1) % len(universe)
+    return pd.DataFrame({
+        "appln_id": np.sort(rng.integers(0, rows // CLASSES_PER_APPLICATION, rows)).astype(np.int64),
+        "cpc_class_symbol": pd.Categorical.from_codes(symbol, categories=universe),
+    })
+
+
+def changed(classes) -> pd.DataFrame:
+    # A typical revision of the list: one entry removed, one added
+    classes = classes.copy()
+    classes.loc[classes["Water"] == "C02F", "Water"] = None
+    classes.loc[len(classes), "Nature"] = "A01G 33"
+    return classes
+
+
+def check(classification, index):
+    labels = index.label(classification.symbols)
+    prefixes = [(p, bits) for by_length in index.prefixes.values() for p, bits in by_length.items()]
+    for symbol, mask in zip(classification.symbols, labels):
+        expected = 0
+        for prefix, bits in prefixes:
+            if symbol.startswith(prefix):
+                expected |= bits
+        assert mask == expected, (symbol, mask, expected)
+    print(f"check: {len(labels):,} distinct symbols labeled as by a startswith loop")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the CPC/IPC focus-area classifier.")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--distinct", type=int, default=250_000, help="Distinct class symbols (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    classes = pd.read_excel(CLASSES_PATH, sheet_name=CLASSES_SHEET)
+    start = time.perf_counter()
+    rows = generate(args.rows, args.distinct, classes, args.seed)
+    print(f"{len(rows):,} rows, {rows['cpc_class_symbol'].nunique():,} distinct symbols generated in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    index = ClassIndex(classes)
+    compiled = time.perf_counter()
+    classification = Classification(rows)
+    mask = classification.areas(index)
+    seconds = time.perf_counter() - start
+    print(f"compile     {(compiled - start) * 1000:8.1f} ms  {index.entries} entries, prefix lengths {sorted(index.prefixes)}")
+    print(f"classify    {seconds:8.2f} s   {len(rows) / seconds:14,.0f} rows/s  {len(mask):,} applications")
+
+    start = time.perf_counter()
+    mask = classification.areas(ClassIndex(changed(classes)))
+    seconds = time.perf_counter() - start
+    print(f"relabel     {seconds:8.2f} s   {len(rows) / seconds:14,.0f} rows/s")
+    for area, bit in AREA_BITS.items():
+        print(f"  {area:16s} {np.count_nonzero(mask & bit) / len(mask):6.1%} of the applications")
+    # Linux reports kilobytes
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MB")
+    if args.check:
+        check(classification, index)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Login lookup latency and concurrent registrations: config.yaml versus the SQLite credential store.
+
+    python benchmarks/credentials.py --users 5000 --lookups 2000
+
+The YAML numbers are what every rerun used to pay (parse the whole file, build the
+credentials dict, look the user up). The store numbers are a lookup through the
+authenticator's mapping, cold (first lookup of a user in the process) and warm.
+The bcrypt check of the password itself costs the same with both and is reported once.
+
+Concurrent registrations run several writers at the same time, each with its own
+connection (like separate workers), and count how many of the new users survived.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import bcrypt
+import yaml
+from yaml.loader import SafeLoader
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.credentials import CredentialStore, Usernames
+
+
+def write_config(path, users, password):
+    config = {
+        "cookie": {"expiry_days": 30, "key": "benchmark", "name": "benchmark_cookie"},
+        "credentials": {"usernames": {f"user{i}": {"email": f"user{i}@example.com", "name": f"User {i}", "password": password} for i in range(users)}},
+        "preauthorized": {"emails": []},
+    }
+    with open(path, "w") as file:
+        yaml.dump(config, file, default_flow_style=False)
+
+
+def percentiles(samples) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 4),
+        "max_ms": round(samples[-1] * 1000, 4),
+    }
+
+
+def yaml_lookup(path, username):
+    # What each rerun did before: parse the file and build stauth's credentials dict
+    with open(path) as file:
+        config = yaml.load(file, Loader=SafeLoader)
+    usernames = {key.lower(): value for key, value in config["credentials"]["usernames"].items()}
+    return usernames[username]["password"]
+
+
+def bench_lookups(config, db, users, lookups, yaml_lookups) -> dict:
+    names = [f"user{random.randrange(users)}" for _ in range(lookups)]
+
+    yaml_times = []
+    for username in names[:yaml_lookups]:
+        start = time.perf_counter()
+        yaml_lookup(config, username)
+        yaml_times.append(time.perf_counter() - start)
+
+    mapping = Usernames(CredentialStore(db))
+    cold, warm = [], []
+    for username in names:
+        seen = username in mapping.store._users
+        start = time.perf_counter()
+        mapping[username]["password"]
+        (warm if seen else cold).append(time.perf_counter() - start)
+    # Second pass: every user is cached now
+    for username in names:
+        start = time.perf_counter()
+        mapping[username]["password"]
+        warm.append(time.perf_counter() - start)
+
+    return {"yaml": percentiles(yaml_times), "store_cold": percentiles(cold), "store_warm": percentiles(warm)}
+
+
+def yaml_registrations(path, writers, per_writer) -> int:
+    # The old Admin page: read config.yaml, add the user, dump the whole file, with no locking.
+    # A writer that reads a half written (or still empty) file fails, like a registration that raised.
+    def register(writer):
+        for i in range(per_writer):
+            try:
+                with open(path) as file:
+                    config = yaml.load(file, Loader=SafeLoader)
+                config["credentials"]["usernames"][f"new{writer}_{i}"] = {"email": "x@example.com", "name": "x", "password": "x"}
+                with open(path, "w") as file:
+                    yaml.dump(config, file, default_flow_style=False)
+            except (yaml.YAMLError, TypeError):
+                pass
+
+    run_threads(register, writers)
+    with open(path) as file:
+        config = yaml.load(file, Loader=SafeLoader) or {}
+    return sum(name.startswith("new") for name in config.get("credentials", {}).get("usernames", {}))
+
+
+def store_registrations(db, writers, per_writer) -> int:
+    def register(writer):
+        mapping = Usernames(CredentialStore(db))
+        for i in range(per_writer):
+            mapping[f"new{writer}_{i}"] = {"email": "x@example.com", "name": "x", "password": "x"}
+
+    run_threads(register, writers)
+    return sum(name.startswith("new") for name in CredentialStore(db).usernames())
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the credential store against config.yaml.")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--yaml-lookups", type=int, default=20, help="YAML lookups are slow, so fewer are timed")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--registrations", type=int, default=25, help="Registrations per writer")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # One cheap hash for every generated user, only the real check below uses the production cost
+    password = bcrypt.hashpw(b"benchmark", bcrypt.gensalt(4)).decode()
+    with tempfile.TemporaryDirectory() as tmp:
+        config, db = Path(tmp) / "config.yaml", Path(tmp) / "credentials.sqlite3"
+        write_config(config, args.users, password)
+        start = time.perf_counter()
+        CredentialStore(db).import_yaml(config)
+        import_seconds = time.perf_counter() - start
+
+        results = {"users": args.users, "import_seconds": round(import_seconds, 3)}
+        results["lookup"] = bench_lookups(config, db, args.users, args.lookups, args.yaml_lookups)
+
+        start = time.perf_counter()
+        bcrypt.checkpw(b"benchmark", bcrypt.hashpw(b"benchmark", bcrypt.gensalt(12)))
+        results["bcrypt_check_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        # Registrations start from a small config, rewriting thousands of users would take minutes
+        expected = args.writers * args.registrations
+        write_config(config, 50, password)
+        results["registrations"] = {
+            "expected": expected,
+            "yaml": yaml_registrations(config, args.writers, args.registrations),
+            "store": store_registrations(db, args.writers, args.registrations),
+        }
+
+    print(f"{args.users:,} users, imported from YAML in {results['import_seconds']:.2f}s")
+    for name, stats in results["lookup"].items():
+        print(f"  {name:12s} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  max {stats['max_ms']:9.3f} ms")
+    print(f"  bcrypt check (cost 12, same for both): {results['bcrypt_check_ms']:.0f} ms")
+    registrations = results["registrations"]
+    print(f"Concurrent registrations ({args.writers} writers): {registrations['yaml']}/{expected} kept with YAML, {registrations['store']}/{expected} with the store")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
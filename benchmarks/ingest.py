@@ -0,0 +1,98 @@
+"""Rows per second and peak memory of the chunked Excel conversion (utils/streaming_ingest.py).
+
+    python benchmarks/ingest.py --rows 1000000
+    python benchmarks/ingest.py --rows 50000 --chunk-size 5000 --check
+
+A workbook shaped like the raw extract is written once into --workdir. Its types change after
+the first chunk, as they do in real extracts: a numeric column gets text from MIXED_FROM of the
+rows on, an integer column gets fractions, and a column that starts empty gets text. The
+conversion is timed with utils.streaming_ingest.ingest.
+
+--check reads the whole workbook with pd.read_excel and arrow_safe, the path of smaller
+workbooks, and compares it with the converted file column by column.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.data_loader import CACHE_SUFFIX, arrow_safe
+from utils.streaming_ingest import CHUNK_SIZE, ingest, peak_rss_mb
+
+WORKDIR = ROOT / "benchmarks" / ".work"
+SHEET = "Sheet1"
+COUNTRIES = ["Denmark", "Germany", "Sweden", "Japan", "United States", "France"]
+MIXED_FROM = 0.8  # share of the rows after which the type changing columns change
+
+
+def write_workbook(path, rows, seed=0):
+    if path.exists():
+        return
+    from openpyxl import Workbook
+
+    rng = np.random.default_rng(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet(SHEET)
+    sheet.append(["appln_id", "earliest_publn_year", "person_ctry_code", "psn_name", "appln_auth", "share", "note"])
+    change = int(rows * MIXED_FROM)
+    years, countries, names = rng.integers(2011, 2023, rows), rng.integers(0, len(COUNTRIES), rows), rng.integers(0, rows // 10 + 1, rows)
+    for i in range(rows):
+        late = i >= change
+        sheet.append([
+            i,
+            int(years[i]),
+            COUNTRIES[countries[i]],
+            f"COMPANY {names[i]}",
+            ("EP" if i % 2 else "WO") if late and i % 3 == 0 else int(names[i] % 10),  # numeric, then mixed
+            (names[i] % 4) / 2 if late else int(names[i] % 4),  # integer, then fractions
+            f"note {i}" if late and i % 7 == 0 else None,  # empty, then text
+        ])
+    tmp = path.with_name(path.name + ".tmp")
+    wb.save(tmp)
+    tmp.replace(path)
+
+
+def check(path, target):
+    full = pa.Table.from_pandas(arrow_safe(pd.read_excel(path, SHEET)), preserve_index=False)
+    streamed = pa.ipc.open_file(pa.memory_map(str(target))).read_all()
+    assert streamed.column_names == full.column_names, (streamed.column_names, full.column_names)
+    for name in full.column_names:
+        a, b = streamed[name], full[name]
+        assert a.type == b.type, (name, a.type, b.type)
+        assert a.equals(b), (name, a.filter(pa.compute.invert(pa.compute.equal(a, b).fill_null(False))).to_pylist()[:5])
+    print(f"check: {streamed.num_rows:,} rows and {streamed.num_columns} columns as read by pd.read_excel + arrow_safe")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rows per second of the chunked Excel conversion.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=str(WORKDIR))
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    path = Path(args.workdir) / f"ingest-{args.rows}-{args.seed}.xlsx"
+    start = time.perf_counter()
+    write_workbook(path, args.rows, args.seed)
+    print(f"{args.rows:,} rows ({path.stat().st_size / 1e6:,.0f} MB) ready in {time.perf_counter() - start:.1f}s")
+
+    target = path.with_suffix(CACHE_SUFFIX)
+    report = ingest(path, target, SHEET, args.chunk_size)
+    print(f"ingest  {report['seconds']:8.2f} s  {report['rows_per_second']:10,.0f} rows/s  peak RSS {report['peak_rss_mb']:,.0f} MB")
+    if args.check:
+        check(path, target)
+        print(f"peak RSS with the full read {peak_rss_mb():,.0f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Abstracts per second of the keyword matcher (utils/keywords.py) on synthetic abstracts.
+
+    python benchmarks/keywords.py --abstracts 200000 --workers 4
+    python benchmarks/keywords.py --abstracts 20000 --check
+
+Abstracts are about 150 words of a synthetic vocabulary, one in ten with a word with
+diacritics, and about one in ten contains one of the keywords (half of them in upper case
+and with diacritics). They are written once as a PATSTAT-like
+tls203_appln_abstr CSV (appln_id, appln_abstract) into --workdir and matched from there with
+utils.keywords.match_file, so reading the chunks and the process pool are part of the time.
+The same abstracts are also matched with one regex search per keyword on a sample, the
+approach the matcher replaces.
+
+--check compares the flags of the sample with the regex search.
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.keywords import WILDCARD, match_file, normalize_text
+from utils.streaming_ingest import peak_rss_mb
+
+WORKDIR = ROOT / "benchmarks" / ".work"
+WORDS_PER_ABSTRACT = 150
+VOCABULARY = 20_000
+KEYWORDS = 400
+MATCHING_SHARE = 0.1
+ACCENTED_SHARE = 0.1
+REGEX_SAMPLE = 500
+ACCENTS = str.maketrans("aeou", "åéøü")
+
+
+def words(rng, n, shortest=2, longest=12) -> np.ndarray:
+    lengths = rng.integers(shortest, longest, n)
+    letters = rng.choice(list("abcdefghijklmnopqrstuvwxyz"), lengths.sum())
+    return np.array(["".join(letters[i - length:i]) for i, length in zip(np.cumsum(lengths), lengths)])
+
+
+def keywords(rng, vocabulary) -> list:
+    # Single words and two word phrases, some truncated, none of them an ordinary word
+    ordinary = set(vocabulary)
+    candidates = [word for word in words(rng, KEYWORDS * 3, 6, 14) if word not in ordinary]
+    result = []
+    for i in range(KEYWORDS):
+        keyword = candidates[i] if i % 3 else f"{candidates[i]} {candidates[KEYWORDS + i]}"
+        result.append(keyword + WILDCARD if i % 7 == 0 else keyword)
+    return result
+
+
+def write_abstracts(path, n, seed=0) -> list:
+    rng = np.random.default_rng(seed)
+    vocabulary = words(rng, VOCABULARY)
+    keyword_list = keywords(rng, vocabulary)
+    abstracts = []
+    for i in range(n):
+        text = vocabulary[rng.integers(0, VOCABULARY, WORDS_PER_ABSTRACT)].astype(object)
+        if rng.random() < ACCENTED_SHARE:
+            position = rng.integers(0, WORDS_PER_ABSTRACT)
+            text[position] = text[position].translate(ACCENTS)
+        if rng.random() < MATCHING_SHARE:
+            # In upper case and with diacritics half of the time, the matcher normalizes both away
+            keyword = keyword_list[rng.integers(0, KEYWORDS)].rstrip(WILDCARD)
+            text[rng.integers(0, WORDS_PER_ABSTRACT)] = keyword.translate(ACCENTS).upper() if rng.random() < 0.5 else keyword
+        abstracts.append(" ".join(text).capitalize() + ".")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({"appln_id": np.arange(n), "appln_abstract": abstracts}).to_csv(path, index=False)
+    return keyword_list
+
+
+def regex_flags(keyword_list, texts) -> np.ndarray:
+    # One pattern per keyword, tried one after the other on every abstract
+    patterns = [re.compile((r"\b" if not k.startswith(WILDCARD) else "") + re.escape(normalize_text(k.strip(WILDCARD)))
+                           + (r"\b" if not k.endswith(WILDCARD) else "")) for k in keyword_list]
+    return np.array([any(p.search(normalize_text(text)) for p in patterns) for text in texts])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Abstracts per second of the keyword matcher.")
+    parser.add_argument("--abstracts", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=str(WORKDIR))
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    path = Path(args.workdir) / f"abstracts-{args.abstracts}-{args.seed}.csv"
+    start = time.perf_counter()
+    keyword_list = write_abstracts(path, args.abstracts, args.seed)
+    print(f"{args.abstracts:,} abstracts ({path.stat().st_size / 1e6:,.0f} MB), {len(keyword_list)} keywords written in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    flags = match_file(path, keyword_list, chunk_size=args.chunk_size, workers=args.workers)
+    seconds = time.perf_counter() - start
+    print(f"automaton   {seconds:8.2f} s  {args.abstracts / seconds:10,.0f} abstracts/s  {path.stat().st_size / 1e6 / seconds:6.1f} MB/s  "
+          f"{flags['abstract_match'].mean():.1%} match")
+
+    sample = pd.read_csv(path, nrows=REGEX_SAMPLE)
+    start = time.perf_counter()
+    expected = regex_flags(keyword_list, sample["appln_abstract"])
+    seconds = time.perf_counter() - start
+    print(f"regex loop  {seconds:8.2f} s  {len(sample) / seconds:10,.0f} abstracts/s  (first {len(sample):,} abstracts, one process)")
+    print(f"peak RSS {peak_rss_mb():,.0f} MB")
+    if args.check:
+        found = flags.set_index("appln_id").loc[sample["appln_id"], "abstract_match"].to_numpy()
+        assert (found == expected).all(), sample["appln_abstract"][found != expected].head().tolist()
+        print(f"check: {len(sample):,} abstracts flagged as by the regex search")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Rerun latency of the main page on synthetic data of 10k, 1M and 10M applications.
+
+    python benchmarks/reruns.py                              # all sizes, 10 reruns per interaction
+    python benchmarks/reruns.py --sizes 10k 1m --runs 20
+    python benchmarks/reruns.py --compare benchmarks/results/reruns-1a2b3c4.json
+
+For every size a workspace is generated once with benchmarks/synthetic.py (kept in --workdir
+and reused) and measured in a fresh interpreter, with Streamlit's AppTest (streamlit >= 1.28, see requirements.txt):
+
+    cold_start    first run of the login screen, including the imports
+    first_render  first authenticated run: loading the dataset, the cube and every chart
+    interactions  one rerun per widget change, each change different from the one before
+
+The result goes to --out as JSON (commit, versions and the timings per size), so results of
+two commits can be compared with --compare.
+"""
+import argparse
+import json
+import math
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.synthetic import MARKER, SIZES, write_workspace
+
+ENTRY = "📄_Patent_Applications.py"
+WORKDIR = ROOT / "benchmarks" / ".work"
+RESULTS = ROOT / "benchmarks" / "results"
+
+USER = {"authentication_status": True, "name": "Emil Hansen", "username": "esh", "logout": None}
+COUNTRIES = ["Germany", "Sweden", "Japan", "Denmark"]
+AREA_SELECTIONS = [["Water", "Air"], ["Waste, Resources & Materials"], ["Nature", "Climate", "Water"], ["Water", "Air", "Waste, Resources & Materials", "Climate", "Nature"]]
+TOP_COUNTRIES = [5, 20, 10]
+YEAR_RANGES = [(2018, 2022), (2011, 2015), (2014, 2020), (2011, 2022)]
+FORMATS = ["csv", "parquet", "xlsx"]
+
+
+def select_country(at, i):
+    at.sidebar.selectbox[0].select(COUNTRIES[i % len(COUNTRIES)])
+
+
+def toggle_normalization(at, i):
+    at.checkbox(key="norm_checkbox").set_value(i % 2 == 1)
+
+
+def select_areas(at, i):
+    at.multiselect[0].set_value(AREA_SELECTIONS[i % len(AREA_SELECTIONS)])
+
+
+def company_page(at, i):
+    at.number_input(key="companies_page_" + at.sidebar.selectbox[0].value).set_value(1 + (i + 1) % 2)
+
+
+def download_format(at, i):
+    at.radio(key="tech-data-format").set_value(FORMATS[i % len(FORMATS)])
+
+
+def top_countries(at, i):
+    at.number_input(key="number_countries_input").set_value(TOP_COUNTRIES[i % len(TOP_COUNTRIES)])
+
+
+def year_range(at, i):
+    at.slider(key="year_range").set_range(*YEAR_RANGES[i % len(YEAR_RANGES)])
+
+
+def single_country(value):
+    def change(at):
+        at.checkbox(key="single_country_selectbox").set_value(value)
+    return change
+
+
+# name: (change applied before, without timing, or None; the timed change)
+INTERACTIONS = {
+    "country_select": (None, select_country),
+    "normalization_toggle": (None, toggle_normalization),
+    "area_multiselect": (None, select_areas),
+    "company_page": (None, company_page),
+    "download_format": (None, download_format),
+    "year_range": (None, year_range),
+    "top_countries": (single_country(False), top_countries),
+}
+
+
+def timed_run(at) -> float:
+    start = time.perf_counter()
+    at.run()
+    seconds = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError("; ".join(e.message for e in at.exception))
+    return seconds
+
+
+def summary(samples) -> dict:
+    # The first rerun of an interaction can build a cache entry the later ones reuse, so it is kept apart
+    first, rest = samples[0], sorted(samples[1:]) or samples
+    return {
+        "first_ms": round(first * 1000, 1),
+        "p50_ms": round(statistics.median(rest) * 1000, 1),
+        "p95_ms": round(rest[math.ceil(len(rest) * 0.95) - 1] * 1000, 1),
+        "runs": len(samples),
+    }
+
+
+def child(runs):
+    """Runs inside the measured interpreter, in the workspace. Prints one JSON line."""
+    from streamlit.testing.v1 import AppTest
+
+    login = AppTest.from_file(str(ROOT / ENTRY), default_timeout=600)
+    result = {"cold_start_ms": round(timed_run(login) * 1000, 1)}
+
+    at = AppTest.from_file(str(ROOT / ENTRY), default_timeout=600)
+    for key, value in USER.items():
+        at.session_state[key] = value
+    result["first_render_ms"] = round(timed_run(at) * 1000, 1)
+
+    result["interactions"] = {}
+    for name, (setup, change) in INTERACTIONS.items():
+        if setup is not None:
+            setup(at)
+            timed_run(at)
+        samples = []
+        for i in range(runs):
+            change(at, i)
+            samples.append(timed_run(at))
+        result["interactions"][name] = summary(samples)
+    # Linux reports kilobytes
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(result))
+
+
+def workspace(size, n, workdir, seed) -> Path:
+    out = Path(workdir) / size
+    marker = out / MARKER
+    if not marker.exists() or json.loads(marker.read_text()) != {"applications": n, "seed": seed}:
+        print(f"Generating {size} ...")
+        write_workspace(out, n, seed)
+    return out
+
+
+def measure(out, runs) -> dict:
+    proc = subprocess.run([sys.executable, __file__, "--child", "--runs", str(runs)], cwd=out, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-3000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def versions() -> dict:
+    import numpy
+    import pandas
+    import pyarrow
+    import streamlit
+    return {"python": platform.python_version(), "streamlit": streamlit.__version__, "pandas": pandas.__version__,
+            "numpy": numpy.__version__, "pyarrow": pyarrow.__version__}
+
+
+def flatten(result) -> dict:
+    # "10k cold_start_ms", "10k country_select p50_ms", ... for the comparison
+    flat = {}
+    for size, timings in result["sizes"].items():
+        for key in ("cold_start_ms", "first_render_ms", "peak_rss_mb"):
+            flat[f"{size} {key}"] = timings[key]
+        for name, stats in timings["interactions"].items():
+            for key in ("first_ms", "p50_ms", "p95_ms"):
+                flat[f"{size} {name} {key}"] = stats[key]
+    return flat
+
+
+def compare(result, path):
+    before = json.loads(Path(path).read_text())
+    print(f"\nAgainst {before['commit']} ({path}):")
+    old = flatten(before)
+    for key, value in flatten(result).items():
+        if key in old and old[key]:
+            print(f"  {key:45s} {old[key]:10.1f} -> {value:10.1f}  {value / old[key] - 1:+7.1%}")
+
+
+def report(size, timings):
+    print(f"{size}: cold start {timings['cold_start_ms']:,.0f} ms, first render {timings['first_render_ms']:,.0f} ms, peak RSS {timings['peak_rss_mb']:,.0f} MB")
+    for name, stats in timings["interactions"].items():
+        print(f"  {name:22s} first {stats['first_ms']:8.1f} ms  p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerun latency of the main page on synthetic data.")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1m", "10m"], choices=list(SIZES))
+    parser.add_argument("--runs", type=int, default=10, help="Reruns per interaction (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=str(WORKDIR), help="Where the generated workspaces are kept (default: %(default)s)")
+    parser.add_argument("--out", help=f"Result file (default: {RESULTS.relative_to(ROOT)}/reruns-<commit>.json)")
+    parser.add_argument("--compare", help="An earlier result file to compare with")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    try:
+        from streamlit.testing.v1 import AppTest  # noqa: F401
+    except ImportError:
+        print("The benchmark needs Streamlit's AppTest (streamlit >= 1.28), install the pinned version: pip install -r requirements.txt")
+        return 1
+    if args.child:
+        child(args.runs)
+        return 0
+
+    result = {**git_commit(), "created": datetime.now(timezone.utc).isoformat(timespec="seconds"), "versions": versions(),
+              "runs": args.runs, "seed": args.seed, "sizes": {}}
+    for size in args.sizes:
+        out = workspace(size, SIZES[size], args.workdir, args.seed)
+        timings = measure(out, args.runs)
+        result["sizes"][size] = {"applications": SIZES[size], **timings}
+        report(size, timings)
+
+    path = Path(args.out) if args.out else RESULTS / f"reruns-{result['commit']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, indent=2))
+    print(f"Written to {path}")
+    if args.compare:
+        compare(result, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
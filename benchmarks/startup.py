@@ -0,0 +1,143 @@
+"""Cold start of the dashboard: time to first render of a page and the imports that cost the most.
+
+    python benchmarks/startup.py                       # login screen of the entry point
+    python benchmarks/startup.py --page "pages/02_🔍_Methodology.py" --runs 5
+    python benchmarks/startup.py --save                # store the result as the baseline
+    python benchmarks/startup.py --max-seconds 4       # fail above an absolute limit
+
+Every run is a fresh interpreter started with -X importtime, like a new container. The page
+is rendered with Streamlit's AppTest where it exists (streamlit >= 1.28), otherwise only the
+module level imports of the page are executed. Exits with 1 when the median time to first
+render is above --max-seconds or more than --tolerance slower than the baseline.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ENTRY = "📄_Patent_Applications.py"
+BASELINE = ROOT / "benchmarks" / "startup_baseline.json"
+
+
+def page_imports(page) -> str:
+    # Module level import statements of a page, for interpreters without AppTest
+    tree = ast.parse(Path(page).read_text(encoding="utf-8"))
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def child(page):
+    """Runs inside the measured interpreter. Prints one JSON line."""
+    sys.path.insert(0, str(ROOT))
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        AppTest = None
+
+    exceptions = []
+    if AppTest is not None:
+        at = AppTest.from_file(str(ROOT / page), default_timeout=120)
+        at.run()
+        exceptions = [e.message for e in at.exception]
+        mode = "apptest"
+    else:
+        exec(page_imports(ROOT / page), {})
+        mode = "imports"
+    print(json.dumps({"mode": mode, "exceptions": exceptions}))
+
+
+def parse_importtime(stderr) -> dict:
+    """Self time in ms per top-level package from -X importtime output."""
+    per_package = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        per_package[name.strip().split(".")[0]] += int(self_us) / 1000
+    return per_package
+
+
+def run_once(page) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", __file__, "--child", page],
+                          cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["seconds"] = seconds
+    result["imports_ms"] = parse_importtime(proc.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark of the dashboard pages.")
+    parser.add_argument("--page", default=ENTRY)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to list")
+    parser.add_argument("--max-seconds", type=float, help="Fail when the median time to first render is above this")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline (default: %(default)s)")
+    parser.add_argument("--save", action="store_true", help="Write the result as the new baseline")
+    parser.add_argument("--json", help="Also write the result to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return 0
+
+    runs = [run_once(args.page) for _ in range(args.runs)]
+    seconds = statistics.median(r["seconds"] for r in runs)
+    imports = {name: statistics.median(r["imports_ms"].get(name, 0.0) for r in runs) for name in runs[0]["imports_ms"]}
+    top = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    result = {
+        "page": args.page,
+        "mode": runs[0]["mode"],
+        "runs": [round(r["seconds"], 3) for r in runs],
+        "seconds": round(seconds, 3),
+        "imports_ms": round(sum(imports.values()), 1),
+        "top_imports_ms": {name: round(ms, 1) for name, ms in top},
+    }
+
+    print(f"{args.page} ({result['mode']}): time to first render {seconds:.2f}s, median of {args.runs} runs {result['runs']}")
+    print(f"Imports: {result['imports_ms']:,.0f} ms in total")
+    for name, ms in top:
+        print(f"  {ms:8.1f} ms  {name}")
+    exceptions = [e for r in runs for e in r["exceptions"]]
+    if exceptions:
+        # A page that stops early would look like a fast start, so it is neither compared nor saved
+        print("FAIL: the page raised: " + "; ".join(dict.fromkeys(exceptions)))
+        return 1
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2))
+    baseline_path = Path(args.baseline)
+    if args.save:
+        baseline_path.write_text(json.dumps(result, indent=2))
+        print(f"Saved baseline to {baseline_path}")
+        return 0
+
+    failed = False
+    if args.max_seconds is not None and seconds > args.max_seconds:
+        print(f"FAIL: {seconds:.2f}s is above the limit of {args.max_seconds:.2f}s")
+        failed = True
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get("page") == args.page and baseline.get("mode") == result["mode"]:
+            limit = baseline["seconds"] * (1 + args.tolerance)
+            print(f"Baseline {baseline['seconds']:.2f}s, limit {limit:.2f}s")
+            if seconds > limit:
+                print(f"FAIL: {seconds:.2f}s is more than {args.tolerance:.0%} slower than the baseline")
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Synthetic raw extract at PATSTAT scale, plus the tables derived from it.
+
+    python benchmarks/synthetic.py 1m --out /tmp/patents-1m
+
+Writes a directory the dashboard can run from: assets/ (copied), data/world_population.xlsx
+(copied), data/build/ with the raw applications and every aggregate of utils.build_aggregates
+as Arrow files, and synthetic.json with the size and seed. Run streamlit (or
+benchmarks/reruns.py) with that directory as the working directory.
+
+Countries follow the real distribution of applications, applicants within a country follow
+a Zipf law, the number of applications grows over the years and about one in five
+applications is in more than one focus area. The raw frame is generated in its compact form
+(categoricals and the area bitmask, see utils.compact) so 10M rows fit in memory.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.build_aggregates import AGGREGATES, INPUTS, Inputs
+from utils.compact import AREA_COLUMNS
+from utils.data_loader import BUILD_DIR, CACHE_SUFFIX, write_cache
+from utils.dataset_store import DATASETS
+
+MARKER = "synthetic.json"
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+YEARS = np.arange(2011, 2023)
+YEAR_GROWTH = 1.06
+# Share of applications in Vand, Luft, Affald, Klimatilpasning, Natur
+AREA_WEIGHTS = np.array([0.3, 0.2, 0.25, 0.15, 0.1])
+EXTRA_AREA_PROBABILITY = 0.2
+APPLICATIONS_PER_APPLICANT = 15
+ZIPF_EXPONENT = 1.4
+
+
+def country_weights() -> pd.Series:
+    # The real number of applications per country
+    tech = pd.read_excel(ROOT / "data" / "teknikområde_opdelinger.xlsx")
+    weights = tech.set_index("country")["antal patenter"].astype(float) + 1
+    return weights / weights.sum()
+
+
+def generate(n, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    weights = country_weights()
+    countries = rng.choice(len(weights), size=n, p=weights.to_numpy())
+
+    # Each country has its own applicants; a few large ones file most of the applications
+    per_country = np.bincount(countries, minlength=len(weights))
+    pool = np.maximum(per_country // APPLICATIONS_PER_APPLICANT, 1)
+    offset = np.r_[0, np.cumsum(pool)[:-1]]
+    applicant = offset[countries] + (rng.zipf(ZIPF_EXPONENT, size=n) - 1) % pool[countries]
+    names = np.array([f"{weights.index[c].upper()} APPLICANT {i - offset[c] + 1}" for c in range(len(weights)) for i in range(offset[c], offset[c] + pool[c])])
+    used, codes = np.unique(applicant, return_inverse=True)
+    order = np.argsort(names[used], kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    year_weights = YEAR_GROWTH ** np.arange(len(YEARS))
+    years = rng.choice(YEARS, size=n, p=year_weights / year_weights.sum())
+
+    areas = np.left_shift(1, rng.choice(len(AREA_COLUMNS), size=n, p=AREA_WEIGHTS)).astype(np.uint8)
+    extra = rng.random(n) < EXTRA_AREA_PROBABILITY
+    areas[extra] |= np.left_shift(1, rng.choice(len(AREA_COLUMNS), size=int(extra.sum()), p=AREA_WEIGHTS)).astype(np.uint8)
+
+    country_names = weights.index.to_numpy()
+    country_order = np.argsort(country_names, kind="stable")
+    country_rank = np.empty_like(country_order)
+    country_rank[country_order] = np.arange(len(country_order))
+    return pd.DataFrame({
+        "appln_id": np.arange(n, dtype=np.int32),
+        "person_ctry_code": pd.Categorical.from_codes(country_rank[countries], categories=country_names[country_order]),
+        "psn_name": pd.Categorical.from_codes(rank[codes], categories=names[used][order]),
+        "earliest_publn_year": years.astype(np.int16),
+        "areas": areas,
+    })
+
+
+def write_workspace(out, n, seed=0, pri=True) -> Path:
+    """Generates n applications into the directory out. Returns out."""
+    out = Path(out)
+    start = time.perf_counter()
+    raw = generate(n, seed)
+    if pri:
+        print(f"{n:,} applications, {raw['psn_name'].cat.categories.size:,} applicants in {time.perf_counter() - start:.1f}s")
+
+    if (out / "assets").exists():
+        shutil.rmtree(out / "assets")
+    shutil.copytree(ROOT / "assets", out / "assets", ignore=shutil.ignore_patterns("*.sqlite3*"))
+    (out / "data").mkdir(parents=True, exist_ok=True)
+    population_path = Path(INPUTS["population"][0])
+    shutil.copy(ROOT / population_path, out / population_path)
+
+    build = out / BUILD_DIR
+    write_cache(raw, build / (Path(DATASETS["rådata"][0]).stem + CACHE_SUFFIX))
+
+    # The aggregates read world_population.xlsx relative to the working directory
+    cwd = Path.cwd()
+    try:
+        os.chdir(out)
+        inputs = Inputs(raw)
+        for name, (builder, _) in AGGREGATES.items():
+            write_cache(builder(inputs), BUILD_DIR / (name + CACHE_SUFFIX))
+    finally:
+        os.chdir(cwd)
+    (out / MARKER).write_text(json.dumps({"applications": n, "seed": seed}))
+    if pri:
+        print(f"Written to {out} in {time.perf_counter() - start:.1f}s")
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic extract the dashboard can run on.")
+    parser.add_argument("size", help=f"Number of applications or one of {', '.join(SIZES)}")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_workspace(args.out, SIZES.get(args.size.lower()) or int(args.size), args.seed)
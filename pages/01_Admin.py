@@ -1,22 +1,12 @@
 import streamlit as st
-import streamlit.components.v1 as components
-import streamlit_authenticator as stauth
-from streamlit_option_menu import option_menu
-
-#For login part (necsesary for streamlit_authenticator)
-import yaml
-from yaml import load, dump
-from yaml.loader import SafeLoader
 
 from PIL import Image
 
-# To send user detail to newly registered user
-import email, smtplib, ssl
-
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from utils import charts
+from utils.credentials import Authenticator, get_credentials
+from utils.dataset_store import get_store
+from utils.mail_queue import get_mail_queue
+from utils.telemetry import get_telemetry, is_admin, sidebar_panel
 
 
 ###################################
@@ -35,6 +25,11 @@ st.set_page_config(
     layout="wide"
 )
 
+# Hidden from the navigation, but the URL still works: nothing below is shown to anybody but the admin
+if not is_admin():
+    st.warning("This page is only available to the administrator. Please log in on the front page.")
+    st.stop()
+
 # Top sidebar CLEAN logo + removal of "Made with Streamlit" & Streamlit menu + no padding top and bottom
 def add_logo():
     st.markdown(
@@ -63,79 +58,86 @@ def add_logo():
     )
 add_logo()
 
-with open('./assets/config.yaml') as file:
-    config = yaml.load(file, Loader=SafeLoader)
+perf = get_telemetry().start("Admin")
+perf.section("registration")
 
-authenticator = stauth.Authenticate(
-    config['credentials'],
-    config['cookie']['name'],
-    config['cookie']['key'],
-    config['cookie']['expiry_days'],
-    config['preauthorized']
-)
+authenticator = Authenticator(get_credentials())
 
 #Register a new user
 try:
     if authenticator.register_user('Register user', preauthorization=False):
         st.success('User registered successfully ✅')
 
-        #Syncs new user information to config.yaml file
-        with open('./assets/config.yaml', 'w') as file:
-            yaml.dump(config, file, default_flow_style=False)
-
-        # Sends e-mail to newly registered user
-        lastUsername = list(config['credentials'].get('usernames'))[-1]
-        newUserEmail = config['credentials'].get('usernames').get(lastUsername).get("email")
-        newUserName = config['credentials'].get('usernames').get(lastUsername).get("name")
-
-        try:
-            subject = "Your new user on CLEAN Insights"
-            sender_email = "noreply@cleancluster.dk"
-            receiver_email = newUserEmail
-            password = st.secrets["server_password"]
-            port = 587
-            smtp_server = "smtp.office365.com"
-
-            # Create a multipart message and set headers
-            message = MIMEMultipart()
-            message["From"] = sender_email
-            message["To"] = receiver_email
-            message["Subject"] = subject
-
-            # Add body to email
-            html = """\
-            <html>
-            <body>
-                <span>Hi $(Name)!</span><br><br>
-                <span>A new personal user for https://clean-insights.streamlit.app/ has been created for you.</span><br>
-                <span><b>Username:</b> $(username)</span><br>
-                <span><b>Password:</b> $(username)</span><br><br>
-                <span>Please reset your password the first time you try to log in. This is done by entering your username and pressing the Login button</span><br><br>
-                <span>Best regards</span><br>
-                <span>CLEAN</span>
-                </p>
-            </body>
-            </html>
-            """
-            html = html.replace("$(Name)", newUserName)
-            html = html.replace("$(username)", lastUsername)
-
-            part1 = MIMEText(html, "html")
-            message.attach(part1)
-
-            # Log in to server using secure context and send email
-            context = ssl.create_default_context()
-            with smtplib.SMTP(smtp_server, port) as server:
-                server.starttls(context=context)
-                server.login(sender_email, password)
-                server.ehlo()
-                server.sendmail(sender_email, receiver_email, message.as_string())
-                server.ehlo()
-
-        #Catch email sending error
-        except Exception as e:
-            st.write(e)
-            st.sidebar.warning(e)
+        # The new user is already saved in the credential store. Sends e-mail to newly registered user
+        lastUsername = authenticator.registered_username
+        newUserEmail = authenticator.credentials['usernames'][lastUsername]["email"]
+        newUserName = authenticator.credentials['usernames'][lastUsername]["name"]
+
+        subject = "Your new user on CLEAN Insights"
+
+        # Add body to email
+        html = """\
+        <html>
+        <body>
+            <span>Hi $(Name)!</span><br><br>
+            <span>A new personal user for https://clean-insights.streamlit.app/ has been created for you.</span><br>
+            <span><b>Username:</b> $(username)</span><br>
+            <span><b>Password:</b> $(username)</span><br><br>
+            <span>Please reset your password the first time you try to log in. This is done by entering your username and pressing the Login button</span><br><br>
+            <span>Best regards</span><br>
+            <span>CLEAN</span>
+            </p>
+        </body>
+        </html>
+        """
+        html = html.replace("$(Name)", newUserName)
+        html = html.replace("$(username)", lastUsername)
+
+        # Queued and sent in the background, the page does not wait for the mail server
+        st.session_state["registration_mail"] = get_mail_queue().enqueue(newUserEmail, subject, html)
 
 except Exception as e:
     st.error(e)
+
+perf.section("mails")
+# Delivery of the registration mails. The status is read again on every rerun, e.g. with the refresh button
+mail_queue = get_mail_queue()
+mail = mail_queue.status(st.session_state["registration_mail"]) if "registration_mail" in st.session_state else None
+if mail:
+    if mail["status"] == "sent":
+        st.sidebar.success(f'Mail sent to {mail["recipient"]}')
+    elif mail["status"] == "failed":
+        st.sidebar.error(f'Mail to {mail["recipient"]} failed after {mail["attempts"]} attempts: {mail["last_error"]}')
+    elif mail["attempts"]:
+        st.sidebar.warning(f'Mail to {mail["recipient"]} not sent yet, attempt {mail["attempts"]} failed: {mail["last_error"]}. Retrying.')
+    else:
+        st.sidebar.info(f'Mail to {mail["recipient"]} is queued')
+
+st.subheader("Registration mails")
+st.button("Refresh", key="refresh_mails")
+st.dataframe(mail_queue.recent(), use_container_width=True)
+st.write(", ".join(f"**{count}** {status}" for status, count in sorted(mail_queue.counts().items())) or "No mails sent yet")
+
+perf.section("datasets")
+# Memory used by the shared dataset store of this worker
+st.subheader("Loaded datasets")
+store = get_store()
+store_stats = store.stats()
+st.dataframe(store_stats, use_container_width=True)
+st.write(f'Total: **{store_stats.drop_duplicates(["dataset", "version"])["bytes"].sum() / 1e6:.1f} MB**')
+# New data files are picked up by a background thread, warmed and swapped in without a restart
+st.write(f'Watcher: **{"running" if store.watching() else "stopped"}**')
+if store.error is not None:
+    st.warning("The last data files could not be loaded, the previous version is still in use. See the server log.")
+if store.reloads:
+    st.dataframe(store.reloads[::-1], use_container_width=True)
+
+perf.section("charts")
+# Server render time and spec size of the cached dashboard charts in this worker
+st.subheader("Chart rendering")
+st.dataframe(charts.cache.stats(), use_container_width=True)
+st.write(f'Chart cache: **{charts.cache.hits}** hits, **{charts.cache.misses}** misses')
+
+perf.section("performance panel")
+sidebar_panel(get_telemetry())
+perf.finish()
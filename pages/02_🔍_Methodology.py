@@ -1,12 +1,12 @@
 import streamlit as st
-import streamlit.components.v1 as components
-import pandas as pd
-from six import BytesIO
-import streamlit_authenticator as stauth
-from streamlit_option_menu import option_menu
 
 from PIL import Image
 
+from utils.assets import get_asset
+from utils.data_loader import read_excel_cached
+from utils.exports import download_button
+from utils.telemetry import get_telemetry, sidebar_panel
+
 # Sets up Favicon, webpage title and layout
 favicon = Image.open(r"./assets/favicon.ico")
 
@@ -44,6 +44,9 @@ def add_logo():
     )
 add_logo()
 
+perf = get_telemetry().start("Methodology")
+perf.section("report")
+
 def style_bullets():
     st.markdown('''
     <style>
@@ -54,21 +57,13 @@ def style_bullets():
     ''', unsafe_allow_html=True)
 
 def convert_excel(path, sheet_name = 'Ark1'):
-    df = pd.read_excel(path, sheet_name)
+    df = read_excel_cached(path, sheet_name)
     return df
 
-def to_excel(df: pd.DataFrame):
-    output = BytesIO() 
-    writer = pd.ExcelWriter(output, engine='xlsxwriter') 
-    df.to_excel(writer, sheet_name='Sheet1') 
-    writer.close() 
-    processed_data = output.getvalue() 
-    return processed_data
-
 st.sidebar.info("The mapping is done by CLEAN in partnership with IRIS Group and the Danish Patent and Trademark Office. The full report is availble for download", icon="ℹ️")
 
-with open("./assets/Miljoeteknologi-En-styrkeposition-for-fremtiden.pdf", "rb") as pdf_file:
-    PDFbyte = pdf_file.read()
+# Read once per process, not on every rerun
+PDFbyte = get_asset("./assets/Miljoeteknologi-En-styrkeposition-for-fremtiden.pdf").data
 
 if st.sidebar.download_button(label="Downlaod report (.pdf)",
     data=PDFbyte,
@@ -92,6 +87,7 @@ st.markdown("- A defined selection of IPC/CPC classes is assigened each of CLEAN
 st.markdown("- Specifically for the subarea 'Water', a combination of IPC/CPC classes with certain keywords in the title and/or abstracts has been used.")
 style_bullets()
 
+perf.section("classes")
 st.subheader("IPC/CPC classes related to environmental technology")
 st.markdown("The CPC is a patent classification system developed by the European Patent Office (EPO) and United States Patent and Trademark Office (USPTO) that contains approximately 200,000 subgroups. The IPC is a hierarchical classification system consisting of about 70,000 subgroups.")
 st.markdown("Below, you can find the exact distribution of IPC/CPC classes used:")
@@ -102,10 +98,9 @@ CPC_IPC_klasser = CPC_IPC_klasser.fillna('')
 
 data_table = st.data_editor(CPC_IPC_klasser, use_container_width=True)
 
-if st.download_button(
-    label='Download data table (.xlsx)', 
-    data=to_excel(data_table),
-    file_name='IPC_&_CPC_Classes.xlsx',
-    mime='application/octet-stream'):
+if download_button(data_table, 'Download data table', 'IPC_&_CPC_Classes'):
     st.toast('Data was sucessfully exported', icon='✅')
 
+perf.section("performance panel")
+sidebar_panel(get_telemetry())
+perf.finish()
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from utils.leaderboard import Leaderboard
+
+MAX_RESULTS = 25
+# Substring matches are confirmed on at most this many candidates per query
+MAX_CANDIDATES = 20000
+# Above every code point, so key + PREFIX_END is after all keys starting with key
+PREFIX_END = "\U0010ffff"
+
+
+def normalize(name) -> str:
+    # Case and runs of whitespace do not matter when searching
+    return " ".join(str(name).casefold().split())
+
+
+def trigrams(keys) -> tuple:
+    """(trigram, key number) pairs of every key, each pair once, sorted by trigram.
+
+    A trigram is three code points packed into one int64 (21 bits each), computed over all
+    keys at once on their UTF-32 encoding.
+    """
+    text = "\0".join(keys) + "\0"
+    points = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    owner = np.repeat(np.arange(len(keys), dtype=np.int32), [len(key) + 1 for key in keys])
+    grams = (points[:-2] << 42) | (points[1:-1] << 21) | points[2:]
+    # Trigrams across the separator between two keys are left out
+    valid = (points[:-2] != 0) & (points[1:-1] != 0) & (points[2:] != 0)
+    grams, owner = grams[valid], owner[:-2][valid]
+    order = np.lexsort((owner, grams))
+    grams, owner = grams[order], owner[order]
+    first = np.r_[True, (grams[1:] != grams[:-1]) | (owner[1:] != owner[:-1])]
+    return grams[first], owner[first]
+
+
+class ApplicantIndex:
+    """Applicant names of every country, searchable by prefix and by substring.
+
+    Built once per dataset version from the leaderboard. Prefix search is a binary search in
+    the sorted names. Substring search looks up the trigrams of the query in an inverted
+    index, intersects their (sorted) lists of names and confirms the few names left. A query
+    never scans the raw applications.
+    """
+
+    def __init__(self, leaderboard: Leaderboard):
+        self.leaderboard = leaderboard
+        rows = leaderboard.rows()
+        codes, names = pd.factorize(rows["company"])
+        self._keys = np.array([normalize(name) for name in names], dtype=object)
+
+        # Leaderboard rows of each name (an applicant can apply from several countries)
+        order = np.argsort(codes, kind="stable")
+        self._rows = order.astype(np.int64)
+        self._row_offsets = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(names)))]
+        # Names with more applications come first among the matches
+        self._patents = np.bincount(codes, weights=rows["patents"].to_numpy(), minlength=len(names))
+
+        self._sorted = np.argsort(self._keys, kind="stable")
+        self._sorted_keys = self._keys[self._sorted]
+
+        grams, owner = trigrams(list(self._keys))
+        starts = np.flatnonzero(np.r_[True, grams[1:] != grams[:-1]])
+        self._grams = grams[starts]
+        self._postings = owner
+        self._posting_offsets = np.r_[starts, len(owner)]
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self._rows, self._row_offsets, self._patents, self._sorted, self._grams,
+                                              self._postings, self._posting_offsets)) + sum(len(key) for key in self._keys)
+
+    def _by_patents(self, names) -> np.ndarray:
+        return names[np.argsort(-self._patents[names], kind="stable")]
+
+    def prefix(self, query, limit=MAX_RESULTS) -> np.ndarray:
+        """Names starting with the query, most applications first."""
+        key = normalize(query)
+        lo = np.searchsorted(self._sorted_keys, key, "left")
+        hi = np.searchsorted(self._sorted_keys, key + PREFIX_END, "left")
+        names = self._sorted[lo:hi]
+        if len(names) > limit:
+            names = names[np.argpartition(-self._patents[names], limit - 1)[:limit]]
+        return self._by_patents(names)
+
+    def _posting(self, gram) -> np.ndarray:
+        i = np.searchsorted(self._grams, gram)
+        if i == len(self._grams) or self._grams[i] != gram:
+            return self._postings[:0]
+        return self._postings[self._posting_offsets[i]:self._posting_offsets[i + 1]]
+
+    def substring(self, query, limit=MAX_RESULTS) -> np.ndarray:
+        """Names containing the query anywhere, most applications first. Needs 3 characters or more."""
+        key = normalize(query)
+        if len(key) < 3:
+            return self._sorted[:0]
+        grams, _ = trigrams([key])
+        postings = sorted((self._posting(gram) for gram in grams), key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if len(candidates) == 0 or len(posting) == 0:
+                return candidates[:0]
+            if len(candidates) * 16 < len(posting):
+                # Few candidates: binary search in the (sorted) next list
+                found = np.minimum(np.searchsorted(posting, candidates), len(posting) - 1)
+                candidates = candidates[posting[found] == candidates]
+            else:
+                member = np.zeros(len(self._keys), dtype=bool)
+                member[posting] = True
+                candidates = candidates[member[candidates]]
+        # Having every trigram does not make a substring ("abcxbcd" has those of "abcd"), so the
+        # candidates are confirmed, the ones with the most applications first
+        if len(candidates) > MAX_CANDIDATES:
+            candidates = candidates[np.argpartition(-self._patents[candidates], MAX_CANDIDATES - 1)[:MAX_CANDIDATES]]
+        candidates = self._by_patents(candidates)
+        found = []
+        for name in candidates:
+            if key in self._keys[name]:
+                found.append(name)
+                if len(found) == limit:
+                    break
+        return np.array(found, dtype=np.int64)
+
+    def search(self, query, limit=MAX_RESULTS) -> pd.DataFrame:
+        """company, country, rank (within the country) and patents of the best matching applicants.
+
+        Names starting with the query come before names that only contain it.
+        """
+        names = self.prefix(query, limit)
+        if len(names) < limit:
+            more = self.substring(query, limit)
+            names = np.r_[names, more[~np.isin(more, names)]][:limit]
+        if len(names) == 0:
+            return self.leaderboard.rows([])
+        rows = np.concatenate([self._rows[self._row_offsets[name]:self._row_offsets[name + 1]] for name in names])
+        return self.leaderboard.rows(rows).reset_index(drop=True)
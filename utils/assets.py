@@ -0,0 +1,31 @@
+import hashlib
+import os
+from functools import cached_property
+
+import streamlit as st
+
+
+class Asset:
+    """A static file, read once per process and shared by every session. Never modified."""
+
+    def __init__(self, path, data: bytes):
+        self.path = path
+        self.data = data
+        # Changes exactly when the content changes, like an HTTP ETag
+        self.etag = hashlib.sha1(data).hexdigest()
+
+    @cached_property
+    def text(self) -> str:
+        return self.data.decode("utf-8")
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _load(path, mtime_ns, size) -> Asset:
+    with open(path, "rb") as file:
+        return Asset(path, file.read())
+
+
+def get_asset(path) -> Asset:
+    # A stat per rerun is all it costs; a replaced file gets a new cache entry without a restart
+    stat = os.stat(path)
+    return _load(path, stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,204 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from utils.compact import AREA_COLUMNS, area_flags, compact_applications
+from utils.data_loader import BUILD_DIR, CACHE_SUFFIX, load_table, read_excel_cached, source_fingerprint, write_cache
+
+# name: (path, sheet) of every input the aggregates are derived from
+INPUTS = {
+    "raw": ("./data/Miljøteknologi rådata_new2.xlsx", "Sheet1"),
+    "population": ("./data/world_population.xlsx", "world_population"),
+    "countrycodes": ("./data/Countrycodes.xlsx", "Countrycodes"),
+}
+
+# Countries left out of the dashboard (see the "Countries included" help text)
+EXCLUDED_COUNTRIES = ["Luxembourg", "United States Virgin Islands", "Monaco", "Cook Islands", "Liechtenstein", "Cayman Islands"]
+
+# Countries shown in the yearly development chart
+YEARLY_COUNTRIES = ["Switzerland", "Finland", "Denmark", "Netherlands", "Sweden", "Germany", "Japan", "United States", "Norway", "Israel"]
+
+# Extracts with 2-letter country codes are named through Countrycodes.xlsx. These codes are named
+# differently there than in world_population.xlsx, so they are mapped to the population name directly.
+POPULATION_NAMES = {
+    "BL": "Saint Barthelemy", "BN": "Brunei", "BO": "Bolivia", "CD": "DR Congo", "CG": "Republic of the Congo",
+    "CI": "Ivory Coast", "CW": "Curacao", "FK": "Falkland Islands", "FM": "Micronesia", "IR": "Iran",
+    "KP": "North Korea", "KR": "South Korea", "LA": "Laos", "MD": "Moldova", "MF": "Saint Martin",
+    "MK": "North Macedonia", "MO": "Macau", "PS": "Palestine", "RE": "Reunion", "RU": "Russia",
+    "SX": "Sint Maarten", "SY": "Syria", "SZ": "Eswatini", "TW": "Taiwan", "TZ": "Tanzania",
+    "VA": "Vatican City", "VE": "Venezuela", "VG": "British Virgin Islands", "VI": "United States Virgin Islands",
+    "VN": "Vietnam",
+}
+
+
+def prepare_population(df: pd.DataFrame) -> pd.DataFrame:
+    # world_population.xlsx with the column names of the dashboard tables, indexed by country
+    df = df.rename(columns={"Country/Territory": "country", "2022 Population": "2022 Inhabitants", "CCA3": "ISO_3_alpha"})
+    return df.set_index("country")[["2022 Inhabitants", "ISO_3_alpha"]]
+
+
+class Inputs:
+    """Inputs and the shared per-country tables of one build, each loaded/computed at most once."""
+
+    def __init__(self, raw=None):
+        self._cache = {}
+        if raw is not None:
+            # An extract that is already loaded, e.g. synthetic data for the benchmarks
+            self._cache["raw"] = raw[~raw["person_ctry_code"].isin(EXCLUDED_COUNTRIES)]
+
+    def _get(self, key, builder):
+        if key not in self._cache:
+            self._cache[key] = builder()
+        return self._cache[key]
+
+    def raw(self) -> pd.DataFrame:
+        return self._get("raw", self._load_raw)
+
+    def _load_raw(self):
+        path, sheet = INPUTS["raw"]
+        raw = compact_applications(load_table(path, sheet))
+        countries = raw["person_ctry_code"]
+        if countries.cat.categories.str.len().max() == 2:
+            raw["person_ctry_code"] = countries.cat.rename_categories(self._country_names(countries.cat.categories))
+        return raw[~raw["person_ctry_code"].isin(EXCLUDED_COUNTRIES)]
+
+    def _country_names(self, codes):
+        path, sheet = INPUTS["countrycodes"]
+        names = read_excel_cached(path, sheet).set_index("Column2")["Column1"].to_dict()
+        names.update(POPULATION_NAMES)
+        return [names.get(code, code) for code in codes]
+
+    def population(self) -> pd.DataFrame:
+        def load():
+            path, sheet = INPUTS["population"]
+            return prepare_population(read_excel_cached(path, sheet))
+        return self._get("population", load)
+
+    def per_country(self) -> pd.DataFrame:
+        # Applications, applicants and applications per focus area for every country
+        def build():
+            raw = self.raw()
+            countries = raw["person_ctry_code"]
+            table = area_flags(raw).groupby(countries, observed=True).sum()
+            table["antal patenter"] = countries.groupby(countries, observed=True).size()
+            table["companies"] = raw.groupby("person_ctry_code", observed=True)["psn_name"].nunique()
+            table.index = table.index.astype(str).rename("country")
+            return table
+        return self._get("per_country", build)
+
+    def per_country_year(self) -> pd.Series:
+        def build():
+            raw = self.raw()
+            counts = raw.groupby(["person_ctry_code", "earliest_publn_year"], observed=True).size()
+            return counts.rename_axis(["country", "earliest_publn_year"])
+        return self._get("per_country_year", build)
+
+
+def build_patents_map(inputs: Inputs) -> pd.DataFrame:
+    table = inputs.per_country()[["antal patenter"]].join(inputs.population()[["2022 Inhabitants", "ISO_3_alpha"]], how="inner")
+    df = pd.DataFrame({
+        "country": table.index,
+        "2022 Inhabitants": table["2022 Inhabitants"].to_numpy(),
+        "Patents/(inhabitants/100000)": (table["antal patenter"] / (table["2022 Inhabitants"] / 100000)).to_numpy(),
+        "Patents": table["antal patenter"].to_numpy(),
+        "Highlight": (table.index == "Denmark"),
+        "ISO_3_alpha": table["ISO_3_alpha"].to_numpy(),
+    })
+    return df.sort_values("Patents", ascending=False, kind="mergesort").reset_index(drop=True)
+
+
+def build_tech(inputs: Inputs) -> pd.DataFrame:
+    return inputs.per_country()[AREA_COLUMNS + ["antal patenter"]].sort_index().reset_index()
+
+
+def build_tech_normed(inputs: Inputs) -> pd.DataFrame:
+    tech = inputs.per_country()[AREA_COLUMNS + ["antal patenter"]]
+    inhabitants = inputs.population()["2022 Inhabitants"].reindex(tech.index)
+    normed = tech.div(inhabitants / 100000, axis=0)
+    return normed[inhabitants.notna()].sort_index().reset_index()
+
+
+def build_spread(inputs: Inputs) -> pd.DataFrame:
+    # Average number of applications per applicant
+    table = inputs.per_country()
+    df = pd.DataFrame({"Country": table.index, "Spread": (table["antal patenter"] / table["companies"]).to_numpy(), "Highlight": table.index == "Denmark"})
+    return df.sort_values("Spread", ascending=False, kind="mergesort").reset_index(drop=True)
+
+
+def build_yearly(inputs: Inputs) -> pd.DataFrame:
+    counts = inputs.per_country_year()
+    counts = counts[counts.index.get_level_values("country").isin(YEARLY_COUNTRIES)].reset_index(name="patents")
+    countries = counts["country"].astype(str)
+    inhabitants = countries.map(inputs.population()["2022 Inhabitants"])
+    df = pd.DataFrame({
+        "person_ctry_code": countries,
+        "earliest_publn_year": counts["earliest_publn_year"],
+        "patents_normed": counts["patents"] / (inhabitants / 100000),
+    })
+    order = df["person_ctry_code"].map({country: i for i, country in enumerate(YEARLY_COUNTRIES)})
+    return df.assign(order=order).sort_values(["order", "earliest_publn_year"]).drop(columns="order").reset_index(drop=True)
+
+
+def build_normed_sorted(inputs: Inputs) -> pd.DataFrame:
+    patents_map = build_patents_map(inputs)
+    df = patents_map[["country", "2022 Inhabitants", "Patents/(inhabitants/100000)", "Highlight"]]
+    df = df.rename(columns={"country": "Country", "Patents/(inhabitants/100000)": "patents/(inhabitants/100000)"})
+    return df.sort_values("patents/(inhabitants/100000)", ascending=False, kind="mergesort").reset_index(drop=True)
+
+
+# Output (named after the xlsx file it replaces): (builder, inputs it depends on)
+AGGREGATES = {
+    "patents_all_map2": (build_patents_map, ["raw", "population"]),
+    "teknikområde_opdelinger": (build_tech, ["raw"]),
+    "teknikområde_opdelinger_normed": (build_tech_normed, ["raw", "population"]),
+    "spread_data": (build_spread, ["raw"]),
+    "Yearly_change_plot_patents": (build_yearly, ["raw", "population"]),
+    "Normed_patents_sorted": (build_normed_sorted, ["raw", "population"]),
+}
+
+
+def build(out_dir=BUILD_DIR, force=False, xlsx=False, pri=True) -> list:
+    """Rebuilds the aggregates whose inputs changed since the last build. Returns the rebuilt names."""
+    out_dir = Path(out_dir)
+    manifest_path = out_dir / "manifest.json"
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+    fingerprints = {name: source_fingerprint(path, sheet) for name, (path, sheet) in INPUTS.items()}
+
+    inputs = Inputs()
+    rebuilt = []
+    for name, (builder, depends_on) in AGGREGATES.items():
+        # Extracts with 2-letter codes also depend on the country code list
+        used = {dep: fingerprints[dep] for dep in depends_on + ["countrycodes"]}
+        target = out_dir / (name + CACHE_SUFFIX)
+        if not force and target.exists() and manifest.get(name) == used:
+            continue
+        start = time.perf_counter()
+        df = builder(inputs)
+        write_cache(df, target)
+        if xlsx:
+            df.to_excel(out_dir / (name + ".xlsx"), sheet_name="Sheet1", index=False)
+        manifest[name] = used
+        rebuilt.append(name)
+        if pri:
+            print(f"{name}: {len(df)} rows in {time.perf_counter() - start:.2f}s")
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    if pri and not rebuilt:
+        print("All aggregates are up to date.")
+    return rebuilt
+
+
+# Derive every dashboard table from the raw extract: python -m utils.build_aggregates
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the dashboard aggregates from the raw applications.")
+    parser.add_argument("--out", default=str(BUILD_DIR), help="Output directory (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="Rebuild everything, not only what changed")
+    parser.add_argument("--xlsx", action="store_true", help="Also write .xlsx copies for inspection in Excel")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    build(args.out, force=args.force, xlsx=args.xlsx)
+    print(f"Done in {time.perf_counter() - start:.2f}s")
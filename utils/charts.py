@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import altair as alt
+import plotly.graph_objects as go
+
+from utils.concentration import ALL_AREAS, METRICS
+
+HIGHLIGHT_COLOR = '#367366'
+BAR_COLOR = '#85C7A6'
+
+
+def choropleth(b, x_values) -> go.Figure:
+    # Only the three columns the map uses are sent, with the values rounded for a smaller spec
+    fig = go.Figure(data=go.Choropleth(
+        locations = b['ISO_3_alpha'].tolist(),
+        z = b[x_values].round(4).tolist(),
+        text = b['country'].tolist(),
+        colorscale = 'algae',
+        autocolorscale=False,
+        reversescale=False,
+        marker_line_color='darkgray',
+        marker_line_width=0.5,
+        colorbar_title = "No. of Patents",
+    ))
+    fig.update_geos(scope="world", visible=False, resolution=50, showcountries=True, lataxis_showgrid=False, lonaxis_showgrid=False)
+    fig.update_layout(
+        title_text='Patent applications of countries mapped',
+        margin=dict(l=0, r=0, b=0, t=25),
+        height=625,
+        geo=dict(
+            showframe=False,
+            showcoastlines=True,
+        ),
+        geo_bgcolor="#0E1117"
+    )
+    return fig
+
+
+def top_countries(b, x_values, years=(2011, 2022)) -> alt.Chart:
+    return alt.Chart(b[["country", x_values, "highlight"]]).mark_bar().encode(
+        y = alt.Y("country:N",sort='-x'),
+        x = alt.X(x_values+":Q"),
+        color=alt.condition(
+        alt.datum.highlight,
+        alt.value(HIGHLIGHT_COLOR),
+        alt.value(BAR_COLOR)),
+        tooltip=['country', x_values+":Q"]
+    ).properties(
+        title=f"Top countries applying for environmental tachnology patents ({years[0]}-{years[1]})"
+    )
+
+
+def yearly(df) -> alt.Chart:
+    chart = alt.Chart(df[["Country", "earliest_publn_year", "patents_normed"]]).mark_line().encode(
+        x=alt.X('earliest_publn_year:O', axis=alt.Axis(title='Year')),
+        y=alt.Y('patents_normed:Q'),
+        color=alt.Color('Country:N', legend=alt.Legend(title='Country')),
+        tooltip=["Country:N"]
+    ).properties(
+        title="Yearly development in amount of applications for a preselected set of countries"
+    ).transform_calculate(tt="datum.x+' value'")
+
+    # Invisible wide line, so the tooltip is easy to hit
+    tt = chart.mark_line(strokeWidth=30, opacity=0.01)
+    return chart + tt
+
+
+def spread(df, metric="Spread", area=None) -> alt.Chart:
+    title = "Spread of patents across a country's companies"
+    if area and area != ALL_AREAS:
+        title += f" ({area})"
+    return alt.Chart(df[["Country", metric, "Highlight"]]).mark_bar().encode(
+        y = alt.Y("Country:N",sort='-x'),
+        x = alt.X(f"{metric}:Q", axis=alt.Axis(title=METRICS[metric])),
+        color=alt.condition(
+        alt.datum.Highlight,
+        alt.value(HIGHLIGHT_COLOR),
+        alt.value(BAR_COLOR)),
+        tooltip=["Country:N", f"{metric}:Q"]
+    ).properties(
+        title=title
+    )
+
+
+def spec_bytes(chart) -> int:
+    """Size of the spec Streamlit sends to the browser for the chart."""
+    if isinstance(chart, go.Figure):
+        return len(chart.to_json())
+    return len(json.dumps(chart.to_dict()))
+
+
+class ChartCache:
+    """Bounded LRU of built charts, plus render statistics per chart name.
+
+    Keys should contain the dataset version and everything the chart depends on
+    (metric, slice, highlighted country). The cached charts are shared between
+    sessions and must not be modified.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, builder, *args):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+        chart = builder(*args)
+        nbytes = spec_bytes(chart)
+        with self._lock:
+            self.misses += 1
+            self._items[key] = (chart, nbytes)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return chart
+
+    def nbytes(self, key) -> int:
+        with self._lock:
+            entry = self._items.get(key)
+            return entry[1] if entry else 0
+
+    @contextmanager
+    def render(self, name, key):
+        """Times the st.*_chart call of a cached chart and records its serialized size."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                stats = self._stats.setdefault(name, {"renders": 0, "last_ms": 0.0, "total_ms": 0.0, "bytes": 0})
+                stats["renders"] += 1
+                stats["last_ms"] = seconds * 1000
+                stats["total_ms"] += seconds * 1000
+            stats["bytes"] = self.nbytes(key)
+
+    def stats(self) -> list:
+        with self._lock:
+            return [{"chart": name, "renders": s["renders"], "last ms": round(s["last_ms"], 1),
+                     "mean ms": round(s["total_ms"] / s["renders"], 1), "bytes": s["bytes"]} for name, s in self._stats.items()]
+
+
+cache = ChartCache()
@@ -0,0 +1,135 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.compact import AREA_BITS, AREA_COLUMNS
+from utils.data_loader import CACHE_SUFFIX, load_table, write_cache
+
+# The class list shown on the methodology page. Column -> focus-area column of the raw applications.
+CLASSES_PATH = Path("./data/CPC_IPC_klasser.xlsx")
+CLASSES_SHEET = "v2lang"
+CLASS_AREAS = {"Water": "Vand", "Air": "Luft", "Waste": "Affald", "Climate Adaption": "Klimatilpasning", "Nature": "Natur"}
+
+# Symbol columns of the PATSTAT application tables (tls224_appln_cpc, tls209_appln_ipc)
+SYMBOL_COLUMNS = ["cpc_class_symbol", "ipc_class_symbol"]
+
+# Section, class and subclass ("A01G"), then the main group. PATSTAT pads the group with spaces,
+# other extracts with zeros ("A01G0025/00").
+_SUBCLASS_GROUP = r"^([A-HY]\d\d[A-Z])0*(\d)"
+_MAIN_GROUP = r"^[A-HY]\d\d[A-Z]\d+$"
+
+
+def normalize_symbols(symbols: pd.Series) -> pd.Series:
+    """Upper case, without spaces or zero padding: "a01g  25/00" and "A01G0025/00" become "A01G25/00"."""
+    symbols = symbols.astype(str).str.upper().str.replace(r"\s+", "", regex=True)
+    return symbols.str.replace(_SUBCLASS_GROUP, r"\1\2", regex=True)
+
+
+class ClassIndex:
+    """The class list compiled into a prefix index over the CPC/IPC hierarchy.
+
+    An entry covers every symbol below it: "C02F" the whole subclass, "A01G25" main group 25
+    and its subgroups (not group 250), "B01D53/34" the subgroups whose number starts with 34.
+    The prefixes are kept per length, so a symbol is labeled with one dictionary lookup per
+    distinct prefix length (about ten), whatever the size of the list.
+    """
+
+    def __init__(self, classes: pd.DataFrame):
+        self.prefixes = {}  # length -> {prefix: area bits}
+        self.entries = 0
+        for column, area in CLASS_AREAS.items():
+            if column not in classes.columns:
+                continue
+            prefixes = normalize_symbols(classes[column].dropna())
+            # A main group only covers its own subgroups: "A01G25" is matched as "A01G25/"
+            prefixes = prefixes.where(~prefixes.str.match(_MAIN_GROUP), prefixes + "/")
+            for prefix in prefixes[prefixes != ""]:
+                by_length = self.prefixes.setdefault(len(prefix), {})
+                by_length[prefix] = by_length.get(prefix, 0) | AREA_BITS[area]
+                self.entries += 1
+
+    def label(self, symbols: pd.Series) -> np.ndarray:
+        """Area bits (see utils.compact.AREA_BITS) of each normalized symbol, 0 when none applies."""
+        mask = np.zeros(len(symbols), dtype=np.uint8)
+        for length, bits in self.prefixes.items():
+            mask |= symbols.str[:length].map(bits).fillna(0).to_numpy(np.uint8)
+        return mask
+
+
+def load_classes(path=CLASSES_PATH, sheet_name=CLASSES_SHEET) -> ClassIndex:
+    return ClassIndex(load_table(path, sheet_name))
+
+
+class Classification:
+    """Application-classification rows, factorized once so they can be labeled again cheaply.
+
+    Only the distinct symbols are normalized and looked up in the ClassIndex; the rows are then
+    labeled with an array lookup and combined per application with a bitwise or. Relabeling
+    with a changed class list repeats only those two steps.
+    """
+
+    def __init__(self, rows: pd.DataFrame, symbol_column=None):
+        symbol_column = symbol_column or next(col for col in SYMBOL_COLUMNS if col in rows.columns)
+        self.row_application, self.applications = pd.factorize(rows["appln_id"], sort=True)
+        self.row_symbol, symbols = pd.factorize(rows[symbol_column])
+        self.symbols = normalize_symbols(pd.Series(symbols))
+
+    def __len__(self):
+        return len(self.row_application)
+
+    def areas(self, index: ClassIndex) -> np.ndarray:
+        """Area bits per application, in the order of self.applications."""
+        # Rows without a symbol have code -1, which picks the 0 appended at the end
+        symbol_mask = np.r_[index.label(self.symbols), np.uint8(0)]
+        row_mask = symbol_mask[self.row_symbol]
+        mask = np.zeros(len(self.applications), dtype=np.uint8)
+        for bit in AREA_BITS.values():
+            # Duplicate positions all write the same value, so the fancy-indexed or is safe
+            mask[self.row_application[(row_mask & bit) != 0]] |= bit
+        return mask
+
+    def label(self, index: ClassIndex, compact=False) -> pd.DataFrame:
+        """appln_id plus the focus-area columns of the raw extract (the area name or empty).
+
+        With compact=True the areas come as the "areas" bitmask of utils.compact instead.
+        Applications without any matching class are included with no area.
+        """
+        mask = self.areas(index)
+        df = pd.DataFrame({"appln_id": np.asarray(self.applications)})
+        if compact:
+            df["areas"] = mask
+            return df
+        for col in AREA_COLUMNS:
+            df[col] = pd.Categorical.from_codes(np.where((mask & AREA_BITS[col]) != 0, 0, -1), categories=[col])
+        return df
+
+
+def classify(rows: pd.DataFrame, index: ClassIndex = None, compact=False) -> pd.DataFrame:
+    """Focus areas of the applications in rows (appln_id and a CPC or IPC symbol column)."""
+    return Classification(rows).label(index or load_classes(), compact)
+
+
+# python -m utils.classifier tls224_appln_cpc.csv data/build/focus_areas.arrow
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign applications to focus areas from their CPC/IPC classes.")
+    parser.add_argument("source", help="appln_id and cpc_class_symbol (or ipc_class_symbol) rows, .csv/.xlsx/.arrow")
+    parser.add_argument("target", nargs="?", help="Output file (default: next to the source with " + CACHE_SUFFIX + ")")
+    parser.add_argument("--sheet", default="Sheet1")
+    parser.add_argument("--column", help="Symbol column (default: " + " or ".join(SYMBOL_COLUMNS) + ")")
+    parser.add_argument("--classes", default=str(CLASSES_PATH), help="Class list (default: %(default)s, sheet " + CLASSES_SHEET + ")")
+    parser.add_argument("--compact", action="store_true", help="Write the areas bitmask instead of the five area columns")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = load_table(args.source, args.sheet)
+    loaded = time.perf_counter()
+    classification = Classification(rows, args.column)
+    labels = classification.label(load_classes(args.classes), args.compact)
+    seconds = time.perf_counter() - loaded
+    target = Path(args.target or Path(args.source).with_suffix(CACHE_SUFFIX))
+    write_cache(labels, target)
+    print(f"{len(rows):,} rows read in {loaded - start:.1f}s, {len(labels):,} applications labeled in {seconds:.1f}s "
+          f"({len(rows) / seconds:,.0f} rows/s) -> {target}")
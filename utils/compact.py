@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# Focus-area columns of the raw applications, a non-empty cell means the application belongs to the area.
+# In the compact frame they are packed into the "areas" column, bit i set = member of AREA_COLUMNS[i].
+AREA_COLUMNS = ["Vand", "Luft", "Affald", "Klimatilpasning", "Natur"]
+AREA_BITS = {col: 1 << i for i, col in enumerate(AREA_COLUMNS)}
+
+CATEGORY_COLUMNS = ["person_ctry_code", "psn_name"]
+
+
+def to_category(values: pd.Series) -> pd.Series:
+    # Sorted categories, so the integer codes do not depend on the row order of the extract
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.cat.remove_unused_categories()
+        return values.cat.reorder_categories(values.cat.categories.sort_values())
+    categories = pd.Index(values.dropna().unique()).sort_values()
+    return pd.Categorical(values, categories=categories)
+
+
+def pack_areas(df: pd.DataFrame) -> np.ndarray:
+    mask = np.zeros(len(df), dtype=np.uint8)
+    for col, bit in AREA_BITS.items():
+        mask |= np.where(df[col].notna().to_numpy(), bit, 0).astype(np.uint8)
+    return mask
+
+
+def area_flags(df: pd.DataFrame) -> pd.DataFrame:
+    """One boolean column per focus area, for both the raw and the compact frame."""
+    if "areas" not in df.columns:
+        return df[AREA_COLUMNS].notna()
+    mask = df["areas"].to_numpy()
+    return pd.DataFrame({col: (mask & bit) != 0 for col, bit in AREA_BITS.items()}, index=df.index)
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def compact_applications(df: pd.DataFrame, pri=False) -> pd.DataFrame:
+    """Ingest step for the raw applications: categorical names, one bitmask for the areas and downcast numbers."""
+    before = memory_usage(df) if pri else 0
+
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = to_category(df[col])
+
+    if all(col in df.columns for col in AREA_COLUMNS):
+        df["areas"] = pack_areas(df)
+        df = df.drop(columns=AREA_COLUMNS)
+
+    for col in df.select_dtypes(include="integer").columns.drop("areas", errors="ignore"):
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    for col in df.select_dtypes(include="float").columns:
+        df[col] = pd.to_numeric(df[col], downcast="float")
+
+    if pri:
+        after = memory_usage(df)
+        print(f"Raw applications: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB ({before / max(after, 1):.1f}x smaller)")
+    return df
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from utils.build_aggregates import EXCLUDED_COUNTRIES
+from utils.compact import AREA_BITS, AREA_COLUMNS, pack_areas
+from utils.dataset_store import TECH_NAMES
+
+ALL_AREAS = "All focus areas"
+
+# Column: x axis title in the spread chart. "Spread" is the ratio of the old spread_data table.
+METRICS = {
+    "Spread": "Spread (total no. of patent applications / total no. of companies, per country)",
+    "Companies per application": "Companies per patent application",
+    "HHI": "Herfindahl index of the companies' shares of applications (1 = a single company)",
+    "Gini": "Gini coefficient of applications per company (0 = all companies equal)",
+    "Top 1 share": "Share of applications by the largest company",
+    "Top 5 share": "Share of applications by the 5 largest companies",
+    "Top 10 share": "Share of applications by the 10 largest companies",
+}
+TOP_K = (1, 5, 10)
+
+
+def category_codes(values: pd.Series) -> tuple:
+    # Codes (-1 for missing) and categories; a categorical column is used as it is, unused categories included
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    return values.cat.codes.to_numpy(np.int64), np.asarray(values.cat.categories.astype(str))
+
+
+def applicant_counts(rådata: pd.DataFrame, years=None) -> tuple:
+    """Applications per (country, applicant) in all areas and in each focus area, published in the (first, last) years.
+
+    Returns the country of each pair, a list of count arrays over the pairs (all areas first,
+    then AREA_COLUMNS) and the country names. Applications without an applicant or a publication
+    year are left out, as in the cube; years=None is every year.
+    """
+    country, names = category_codes(rådata["person_ctry_code"])
+    applicant, _ = category_codes(rådata["psn_name"])
+    mask = rådata["areas"].to_numpy() if "areas" in rådata.columns else pack_areas(rådata)
+    # Codes are -1 for missing values; the filter works on the codes, the frame is not copied
+    keep = (applicant >= 0) & (country >= 0) & ~np.isin(names, EXCLUDED_COUNTRIES)[country]
+    year = rådata["earliest_publn_year"]
+    keep &= year.notna().to_numpy() if years is None else year.between(*years).to_numpy()
+    country, applicant, mask = country[keep], applicant[keep], mask[keep]
+
+    # Hashing the pairs is linear, sorting ten million rows is not
+    n_applicants = int(applicant.max()) + 1 if len(applicant) else 1
+    pair, keys = pd.factorize(country * n_applicants + applicant)
+    per_area = [np.bincount(pair, minlength=len(keys))]
+    per_area += [np.bincount(pair[(mask & AREA_BITS[col]) != 0], minlength=len(keys)) for col in AREA_COLUMNS]
+    return keys // n_applicants, per_area, names
+
+
+def concentration(rådata: pd.DataFrame, years=None) -> pd.DataFrame:
+    """Concentration of applications on the companies of each country, for all areas and per focus area.
+
+    One row per country and area (ALL_AREAS or the English area name) with the columns of
+    METRICS plus the number of applications and companies. Countries without applications in
+    an area get NaN metrics there.
+    """
+    pair_country, per_area, names = applicant_counts(rådata, years)
+    n_countries = len(names)
+
+    # Group g = area * n_countries + country. Sorting by (group, count) gives every group's
+    # applicants in ascending order, all sums below are then one bincount per column.
+    x = np.concatenate(per_area)
+    group = np.concatenate([area * n_countries + pair_country for area in range(len(per_area))])
+    keep = x > 0
+    x, group = x[keep], group[keep]
+    order = np.argsort(group * (int(x.max()) + 1 if len(x) else 1) + x, kind="stable")
+    x, group = x[order], group[order]
+    n_groups = len(per_area) * n_countries
+
+    n = np.bincount(group, minlength=n_groups)
+    total = np.bincount(group, weights=x, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(n)[:-1]]
+    rank = np.arange(len(x)) - np.repeat(starts, n) + 1  # 1 = smallest applicant of the group
+    from_top = np.repeat(n, n) - rank + 1  # 1 = largest
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df = pd.DataFrame({
+            "Country": np.tile(names, len(per_area)),
+            "Area": np.repeat([ALL_AREAS] + [TECH_NAMES[col] for col in AREA_COLUMNS], n_countries),
+            "Applications": total.astype(np.int64),
+            "Companies": n,
+            "Spread": total / n,
+            "Companies per application": n / total,
+            "HHI": np.bincount(group, weights=x * x, minlength=n_groups) / total ** 2,
+            # Gini of sorted x: 2 * sum(rank * x) / (n * total) - (n + 1) / n
+            "Gini": 2 * np.bincount(group, weights=rank * x, minlength=n_groups) / (n * total) - (n + 1) / n,
+        })
+        for k in TOP_K:
+            df[f"Top {k} share"] = np.bincount(group, weights=x * (from_top <= k), minlength=n_groups) / total
+    # Countries of the category list without any application are left out
+    return df[np.tile(n[:n_countries] > 0, len(per_area))].reset_index(drop=True)
+
+
+def build_concentration(snapshot, years=None) -> pd.DataFrame:
+    # For Snapshot.derived(("concentration", years), lambda d: build_concentration(d, years))
+    return concentration(snapshot["rådata"], years)
@@ -0,0 +1,236 @@
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from pathlib import Path
+
+import streamlit as st
+import streamlit_authenticator as stauth
+from streamlit_authenticator.exceptions import RegisterError
+import yaml
+from yaml.loader import SafeLoader
+
+DB_PATH = Path("./assets/credentials.sqlite3")
+# Users, cookie settings and preauthorized emails are imported from here once, when the database is new
+CONFIG_PATH = Path("./assets/config.yaml")
+
+FIELDS = ("name", "email", "password")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE TABLE IF NOT EXISTS preauthorized (email TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class CredentialStore:
+    """Users in a local SQLite file, with a per-process cache of the rows that were looked up.
+
+    Every write is a transaction, so concurrent registrations (also from other processes)
+    cannot overwrite each other. The cache is dropped whenever the file was changed by
+    another connection, and updated in place for writes made through this one.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._users = {}  # username -> (name, email, password), only for users that exist
+        self._data_version = None
+
+    def _fresh(self):
+        # PRAGMA data_version changes when another connection committed, which is what invalidates the cache
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._users.clear()
+            self._data_version = version
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def get(self, username):
+        """(name, email, password hash) of a user, None when there is no such user."""
+        with self._lock:
+            self._fresh()
+            if username in self._users:
+                return self._users[username]
+            row = self._conn.execute("SELECT name, email, password FROM users WHERE username = ?", (username,)).fetchone()
+            # Misses are not cached: any visitor can try new usernames, and the cache would grow with each one
+            if row is not None:
+                self._users[username] = row
+            return row
+
+    def usernames(self) -> list:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT username FROM users ORDER BY rowid")]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def find(self, field, value):
+        """Username of the first user whose field equals value, None when nobody matches."""
+        if field not in FIELDS:
+            raise KeyError(field)
+        with self._lock:
+            row = self._conn.execute(f"SELECT username FROM users WHERE {field} = ? ORDER BY rowid LIMIT 1", (value,)).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, name, email, password):
+        """Adds a user with an already hashed password. Raises ValueError when the username is taken."""
+        try:
+            self._write("INSERT INTO users (username, name, email, password) VALUES (?, ?, ?, ?)", (username, name, email, password))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Username {username} is already taken") from None
+        with self._lock:
+            self._users[username] = (name, email, password)
+
+    def update_user(self, username, field, value):
+        if field not in FIELDS:
+            raise KeyError(field)
+        if not self._write(f"UPDATE users SET {field} = ? WHERE username = ?", (value, username)):
+            raise KeyError(username)
+        with self._lock:
+            self._users.pop(username, None)
+
+    def delete_user(self, username):
+        if not self._write("DELETE FROM users WHERE username = ?", (username,)):
+            raise KeyError(username)
+        with self._lock:
+            self._users.pop(username, None)
+
+    def setting(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def preauthorized(self) -> list:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT email FROM preauthorized ORDER BY rowid")]
+
+    def remove_preauthorized(self, email):
+        self._write("DELETE FROM preauthorized WHERE email = ?", (email,))
+
+    def import_yaml(self, path=CONFIG_PATH) -> bool:
+        """Imports users, cookie settings and preauthorized emails from the old config.yaml.
+
+        Runs once: returns False without changes when the database was imported before.
+        """
+        with open(path) as file:
+            config = yaml.load(file, Loader=SafeLoader)
+        users = config["credentials"]["usernames"]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM settings WHERE key = 'cookie'").fetchone():
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO users (username, name, email, password) VALUES (?, ?, ?, ?)",
+                    [(username.lower(), user["name"], user["email"], user["password"]) for username, user in users.items()])
+                self._conn.executemany("INSERT OR IGNORE INTO preauthorized (email) VALUES (?)",
+                                       [(email,) for email in (config.get("preauthorized") or {}).get("emails") or []])
+                self._conn.execute("INSERT INTO settings (key, value) VALUES ('cookie', ?)", (json.dumps(config["cookie"]),))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._users.clear()
+        return True
+
+
+class UserRecord(dict):
+    """A user's credential dict. Assigning a field writes it to the store."""
+
+    def __init__(self, store, username, row):
+        super().__init__(zip(FIELDS, row))
+        self._store = store
+        self._username = username
+
+    def __setitem__(self, field, value):
+        self._store.update_user(self._username, field, value)
+        super().__setitem__(field, value)
+
+
+class Usernames(MutableMapping):
+    """The credentials['usernames'] dict of streamlit_authenticator, backed by a CredentialStore."""
+
+    def __init__(self, store: CredentialStore):
+        self.store = store
+
+    def __getitem__(self, username) -> UserRecord:
+        row = self.store.get(username)
+        if row is None:
+            raise KeyError(username)
+        return UserRecord(self.store, username, row)
+
+    def __contains__(self, username):
+        return self.store.get(username) is not None
+
+    def __setitem__(self, username, user):
+        # Only adds: the authenticator assigns a whole user when registering, and the check for a taken
+        # username is not atomic with it. Field changes go through UserRecord. Raises ValueError when taken.
+        self.store.add_user(username, user["name"], user["email"], user["password"])
+
+    def __delitem__(self, username):
+        self.store.delete_user(username)
+
+    def __iter__(self):
+        return iter(self.store.usernames())
+
+    def __len__(self):
+        return self.store.count()
+
+
+class Authenticator(stauth.Authenticate):
+    """stauth.Authenticate with its users in the credential store instead of a dict loaded from YAML."""
+
+    def __init__(self, store: CredentialStore):
+        cookie = store.setting("cookie")
+        super().__init__({"usernames": {}}, cookie["name"], cookie["key"], cookie["expiry_days"],
+                         {"emails": store.preauthorized()})
+        # Authenticate.__init__ copies the usernames into a plain dict, so the store is put in afterwards
+        self.credentials["usernames"] = Usernames(store)
+        self.store = store
+        self.registered_username = None
+
+    def _register_credentials(self, username, name, password, email, preauthorization):
+        # The insert fails when the username was registered since register_user checked it
+        try:
+            self.store.add_user(username, name, email, stauth.Hasher([password]).generate()[0])
+        except ValueError:
+            raise RegisterError("Username already taken") from None
+        if preauthorization:
+            self.preauthorized["emails"].remove(email)
+        self.registered_username = username
+        if preauthorization:
+            self.store.remove_preauthorized(email)
+
+    def _get_username(self, key, value):
+        # Indexed lookup instead of scanning every user
+        return self.store.find(key, value) or False
+
+
+@st.cache_resource
+def get_credentials() -> CredentialStore:
+    store = CredentialStore()
+    if store.setting("cookie") is None:
+        store.import_yaml()
+    return store
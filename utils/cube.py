@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+from utils.build_aggregates import EXCLUDED_COUNTRIES, YEARLY_COUNTRIES
+from utils.compact import AREA_BITS, AREA_COLUMNS, pack_areas
+
+
+class PatentCube:
+    """Applications by country x publication year x focus area, as one dense int32 array.
+
+    Built once per dataset version. Every chart on the main page is a slice of it summed
+    over years and areas, divided by the population when normalized, so a new combination
+    needs no new file and costs a few vectorized operations.
+
+    counts[c, y, a] applications of country c published in year y within area a
+    totals[c, y]    applications of country c in year y (an application may be in several areas)
+    combos[c, y, m] applications whose set of areas is exactly the bitmask m (see utils.compact)
+    population[c]   2022 inhabitants, NaN for countries missing in world_population.xlsx
+    included[c]     False for the countries left out of the charts
+
+    Sums over a year range are the difference of two cumulative sums, so they cost the
+    same for any range. Distinct applicants per range are precomputed for every range.
+    """
+
+    def __init__(self, rådata: pd.DataFrame, population: pd.DataFrame, excluded=()):
+        raw = rådata[rådata["earliest_publn_year"].notna()]
+        countries = raw["person_ctry_code"].astype("category").cat.remove_unused_categories()
+        self.countries = np.asarray(countries.cat.categories.astype(str))
+        self.years = np.sort(raw["earliest_publn_year"].unique().astype(np.int64))
+        if len(self.years) > 64:
+            raise ValueError(f"At most 64 publication years are supported, the extract has {len(self.years)}")
+        self.areas = list(AREA_COLUMNS)
+        self.included = ~np.isin(self.countries, list(excluded))
+        self._country_index = {country: i for i, country in enumerate(self.countries)}
+
+        shape = (len(self.countries), len(self.years))
+        country = countries.cat.codes.to_numpy(np.int64)
+        year = np.searchsorted(self.years, raw["earliest_publn_year"].to_numpy())
+        cell = country * len(self.years) + year
+        size = shape[0] * shape[1]
+        self.totals = np.bincount(cell, minlength=size).astype(np.int32).reshape(shape)
+
+        mask = raw["areas"].to_numpy() if "areas" in raw.columns else pack_areas(raw)
+        self.counts = np.stack([np.bincount(cell[(mask & AREA_BITS[col]) != 0], minlength=size).reshape(shape) for col in self.areas],
+                               axis=-1).astype(np.int32)
+        n_combos = 1 << len(self.areas)
+        self.combos = np.bincount(cell * n_combos + mask, minlength=size * n_combos).astype(np.int32).reshape(shape + (n_combos,))
+
+        # Cumulative sums over the year axis with a leading zero: years lo..hi = cum[:, hi + 1] - cum[:, lo]
+        self._cum_totals = np.pad(self.totals.cumsum(axis=1, dtype=np.int64), ((0, 0), (1, 0)))
+        self._cum_counts = np.pad(self.counts.cumsum(axis=1, dtype=np.int64), ((0, 0), (1, 0), (0, 0)))
+        # Applications in any / all of the areas of every selection s, each counted once:
+        # the combinations m that intersect s (contain s), summed with one matrix product
+        cum_combos = np.pad(self.combos.cumsum(axis=1, dtype=np.int64), ((0, 0), (1, 0), (0, 0)))
+        m, s = np.arange(n_combos)[:, None], np.arange(n_combos)[None, :]
+        self._cum_any = cum_combos @ ((m & s) != 0).astype(np.int64)
+        self._cum_all = cum_combos @ ((m & s) == s).astype(np.int64)
+        self._count_companies(country, raw["psn_name"].astype("category").cat.codes.to_numpy(np.int64), year)
+
+        population = population.reindex(self.countries)
+        self.population = population["2022 Inhabitants"].to_numpy(np.float64)
+        self.iso3 = population["ISO_3_alpha"].to_numpy()
+
+    def _count_companies(self, country, company, year):
+        # Applicants cannot be summed over years, one may apply in several. Each (country, applicant)
+        # pair gets a bitmask of its active years, and the distinct applicants of every range are counted once.
+        valid = company >= 0
+        country, company = country[valid], company[valid]
+        bits = np.left_shift(np.uint64(1), year[valid].astype(np.uint64))
+
+        def presence(keys):
+            order = np.argsort(keys, kind="stable")
+            keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            return keys[starts], np.bitwise_or.reduceat(bits[order], starts) if len(starts) else bits[:0]
+
+        n_companies = int(company.max()) + 1 if len(company) else 1
+        pair_keys, pair_masks = presence(country * n_companies + company)
+        pair_country = pair_keys // n_companies
+        _, company_masks = presence(company)
+
+        n_years, n_countries = len(self.years), len(self.countries)
+        # Pairs with the same set of active years are counted together, there are far fewer sets than pairs
+        masks, inverse = np.unique(pair_masks, return_inverse=True)
+        per_country = np.bincount(pair_country * len(masks) + inverse, minlength=n_countries * len(masks)).reshape(n_countries, len(masks))
+        company_sets, company_counts = np.unique(company_masks, return_counts=True)
+
+        self._companies = np.zeros((n_years, n_years, n_countries), dtype=np.int32)
+        self._all_companies = np.zeros((n_years, n_years), dtype=np.int64)
+        for lo in range(n_years):
+            for hi in range(lo, n_years):
+                in_range = np.uint64(((1 << (hi + 1)) - 1) ^ ((1 << lo) - 1))
+                self._companies[lo, hi] = per_country[:, (masks & in_range) != 0].sum(axis=1)
+                self._all_companies[lo, hi] = company_counts[(company_sets & in_range) != 0].sum()
+
+    def index(self, country) -> int:
+        """Position of the country on the country axis. Raises KeyError when it has no applications."""
+        return self._country_index[country]
+
+    def year_bounds(self, years=None) -> tuple:
+        """(lo, hi) positions on the year axis of an inclusive (first, last) range, None for every year.
+
+        hi < lo when no year of the extract falls in the range.
+        """
+        if years is None:
+            return 0, len(self.years) - 1
+        first, last = years
+        return int(np.searchsorted(self.years, first, "left")), int(np.searchsorted(self.years, last, "right")) - 1
+
+    def area_positions(self, areas) -> list:
+        return [self.areas.index(area) for area in areas]
+
+    def patents(self, years=None, areas=None) -> np.ndarray:
+        """Applications per country. With areas: the sum of the per-area counts."""
+        if areas is not None:
+            return self.by_area(years, areas).sum(axis=1)
+        lo, hi = self.year_bounds(years)
+        if hi < lo:
+            return np.zeros(len(self.countries), dtype=np.int64)
+        return self._cum_totals[:, hi + 1] - self._cum_totals[:, lo]
+
+    def by_area(self, years=None, areas=None) -> np.ndarray:
+        """[country, area] applications, for the given areas (default all) in their given order."""
+        positions = self.area_positions(areas or self.areas)
+        lo, hi = self.year_bounds(years)
+        if hi < lo:
+            return np.zeros((len(self.countries), len(positions)), dtype=np.int64)
+        return self._cum_counts[:, hi + 1, positions] - self._cum_counts[:, lo, positions]
+
+    def distinct(self, years=None, areas=None, match="any") -> np.ndarray:
+        """Applications per country in any (union) or all (intersection) of the areas, each counted once."""
+        selection = sum(AREA_BITS[area] for area in (areas if areas is not None else self.areas))
+        table = self._cum_any if match == "any" else self._cum_all
+        lo, hi = self.year_bounds(years)
+        if hi < lo:
+            return np.zeros(len(self.countries), dtype=np.int64)
+        return table[:, hi + 1, selection] - table[:, lo, selection]
+
+    def companies(self, years=None) -> np.ndarray:
+        """Distinct applicants per country with an application in the years."""
+        lo, hi = self.year_bounds(years)
+        if hi < lo:
+            return np.zeros(len(self.countries), dtype=np.int32)
+        return self._companies[lo, hi]
+
+    def all_companies(self, years=None) -> int:
+        """Distinct applicants over all countries (an applicant active in two countries counts once)."""
+        lo, hi = self.year_bounds(years)
+        return int(self._all_companies[lo, hi]) if hi >= lo else 0
+
+    def per_100k(self, values: np.ndarray) -> np.ndarray:
+        """values per 100.000 inhabitants (country is the first axis), NaN without a population."""
+        inhabitants = self.population / 100000
+        return values / inhabitants.reshape((-1,) + (1,) * (values.ndim - 1))
+
+    def has_population(self) -> np.ndarray:
+        return ~np.isnan(self.population)
+
+    def map_frame(self, years=None) -> pd.DataFrame:
+        """Same columns as patents_all_map2, for countries with a population, most applications first."""
+        patents = self.patents(years)
+        keep = self.has_population() & self.included
+        df = pd.DataFrame({
+            "country": self.countries[keep],
+            "2022 Inhabitants": self.population[keep],
+            "Patents/(inhabitants/100000)": self.per_100k(patents)[keep],
+            "Patents": patents[keep],
+            "Highlight": self.countries[keep] == "Denmark",
+            "ISO_3_alpha": self.iso3[keep],
+        })
+        return df.sort_values("Patents", ascending=False, kind="mergesort").reset_index(drop=True)
+
+    def yearly(self, countries=YEARLY_COUNTRIES) -> pd.DataFrame:
+        """Applications per 100.000 inhabitants per year, long format in the order of countries."""
+        rows = [self.index(country) for country in countries if country in self._country_index]
+        normed = self.totals[rows] / (self.population[rows] / 100000)[:, None]
+        return pd.DataFrame({
+            "person_ctry_code": np.repeat(self.countries[rows], len(self.years)),
+            "earliest_publn_year": np.tile(self.years, len(rows)),
+            "patents_normed": normed.ravel(),
+        })
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.counts, self.totals, self.combos, self._cum_counts, self._cum_totals, self._cum_any, self._cum_all,
+                                              self._companies, self._all_companies, self.population))
+
+
+def build_cube(snapshot) -> PatentCube:
+    # For Snapshot.derived("cube", build_cube)
+    return PatentCube(snapshot["rådata"], snapshot["population"], EXCLUDED_COUNTRIES)
+
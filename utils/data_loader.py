@@ -0,0 +1,159 @@
+import argparse
+import hashlib
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # the cache is an optimisation, plain read_excel still works without it
+    pa = None
+    feather = None
+
+# Converted sheets are stored as uncompressed Arrow IPC (feather v2) files so they can be memory-mapped
+CACHE_DIR = Path("./data/.cache")
+CACHE_SUFFIX = ".arrow"
+# Aggregates derived from the raw extract by utils.build_aggregates, preferred over the hand-made xlsx files
+BUILD_DIR = Path("./data/build")
+# Workbooks larger than this are converted chunk by chunk (see utils.streaming_ingest)
+STREAMING_THRESHOLD = 50 * 1024 * 1024
+
+
+def source_fingerprint(path, sheet_name="Ark1") -> str:
+    """Key for a workbook sheet. Changes whenever the file is replaced or touched."""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{sheet_name}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _cache_prefix(path, sheet_name):
+    # The directory is part of the name, so files with the same name in two directories keep their own entries
+    directory = hashlib.sha1(os.path.abspath(Path(path).parent).encode("utf-8")).hexdigest()[:8]
+    return f"{Path(path).stem}.{directory}.{sheet_name}."
+
+
+def cache_path(path, sheet_name="Ark1") -> Path:
+    return CACHE_DIR / (_cache_prefix(path, sheet_name) + source_fingerprint(path, sheet_name) + CACHE_SUFFIX)
+
+
+def arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    # Arrow needs one type per column. Excel columns mixing numbers and text are stored as text,
+    # keeping the missing cells missing so .count() still behaves the same after a reload.
+    for col in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _remove_stale(path, sheet_name, keep: Path):
+    for old in CACHE_DIR.glob(_cache_prefix(path, sheet_name) + "*" + CACHE_SUFFIX):
+        if old != keep:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def write_cache(df: pd.DataFrame, target: Path):
+    # Written to a temp file and renamed, so a reader never sees a half written cache file
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + f".{os.getpid()}.tmp")
+    table = pa.Table.from_pandas(arrow_safe(df), preserve_index=False)
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, target)
+
+
+def read_cache(target: Path) -> pd.DataFrame:
+    return feather.read_table(target, memory_map=True).to_pandas()
+
+
+def read_excel_cached(path, sheet_name="Ark1") -> pd.DataFrame:
+    """pd.read_excel, served from the columnar cache when the source has not changed since the last conversion."""
+    if feather is None:
+        return pd.read_excel(path, sheet_name)
+
+    target = cache_path(path, sheet_name)
+    if target.exists():
+        try:
+            return read_cache(target)
+        except (OSError, pa.ArrowInvalid):
+            pass  # broken cache file, rebuild it below
+
+    df = pd.read_excel(path, sheet_name)
+    if all(isinstance(col, str) for col in df.columns):
+        try:
+            write_cache(df, target)
+            _remove_stale(path, sheet_name, target)
+        except (OSError, pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    return df
+
+
+def resolve_source(path):
+    """The built aggregate for a data file when there is one, otherwise the file itself."""
+    built = BUILD_DIR / (Path(path).stem + CACHE_SUFFIX)
+    return built if built.exists() else Path(path)
+
+
+def streamed(path) -> bool:
+    # .xlsb and .csv extracts and big workbooks are converted chunk by chunk
+    return feather is not None and (Path(path).suffix in (".xlsb", ".csv") or os.path.getsize(path) > STREAMING_THRESHOLD)
+
+
+def stream_to_cache(path, sheet_name="Ark1") -> Path:
+    """The cache file of a sheet, converted with bounded memory when it is missing."""
+    from utils.streaming_ingest import ingest
+
+    target = cache_path(path, sheet_name)
+    if not target.exists():
+        ingest(path, target, sheet_name)
+        _remove_stale(path, sheet_name, target)
+    return target
+
+
+def read_streamed_cached(path, sheet_name="Ark1") -> pd.DataFrame:
+    """Like read_excel_cached, but converts with bounded memory. Text columns come back as categoricals."""
+    from utils.streaming_ingest import read_ingested
+
+    return read_ingested(stream_to_cache(path, sheet_name))
+
+
+def load_table(path, sheet_name="Ark1") -> pd.DataFrame:
+    # Built aggregates are already columnar, big extracts are streamed, other workbooks go through the cache
+    path = Path(path)
+    if path.suffix == CACHE_SUFFIX:
+        return read_cache(path)
+    if streamed(path):
+        return read_streamed_cached(path, sheet_name)
+    return read_excel_cached(path, sheet_name)
+
+
+def build_cache(paths=None, pri=True):
+    """Converts every sheet of the given workbooks (default: all of ./data) so the first visitor does not pay for openpyxl.
+
+    Big workbooks are streamed into the cache and not loaded, so memory stays flat for any size.
+    """
+    if paths is None:
+        paths = sorted(Path("./data").glob("*.xlsx"))
+    for path in paths:
+        for sheet_name in pd.ExcelFile(path).sheet_names:
+            start = time.perf_counter()
+            if streamed(path):
+                stream_to_cache(path, sheet_name)
+            else:
+                read_excel_cached(path, sheet_name)
+            if pri:
+                print(f"{path} [{sheet_name}] cached in {time.perf_counter() - start:.2f}s")
+
+
+# Pre-build the cache at deploy time: python -m utils.data_loader [workbook.xlsx ...]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the Excel data files to the columnar cache.")
+    parser.add_argument("paths", nargs="*", help="Workbooks to convert. Defaults to every .xlsx file in ./data")
+    args = parser.parse_args()
+    build_cache(args.paths or None)
@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime import Runtime
+
+from utils.build_aggregates import prepare_population
+from utils.compact import compact_applications
+from utils.data_loader import load_table, resolve_source, source_fingerprint
+
+# Sessions that have not rerun for this long no longer hold on to a dataset version
+SESSION_TTL = 60 * 60
+# How often the watcher looks for changed data files
+WATCH_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+TECH_NAMES = {"Natur": "Nature", "Luft": "Air", "Vand": "Water", "Klimatilpasning": "Climate", "Affald": "Waste, Resources & Materials"}
+
+
+# name: (path, sheet, preparation applied once when a version is loaded).
+# Aggregates built by utils.build_aggregates are used instead of the xlsx files when present.
+# The charts are derived from the raw applications (see utils.cube and utils.concentration).
+DATASETS = {
+    "rådata": ("./data/Miljøteknologi rådata_new2.xlsx", "Sheet1", compact_applications),
+    "population": ("./data/world_population.xlsx", "world_population", prepare_population),
+}
+
+
+class Dataset:
+    """One loaded version of one data file. Never modified after loading."""
+
+    def __init__(self, name, version, frame: pd.DataFrame):
+        self.name = name
+        self.version = version
+        self.frame = frame
+        self.nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+
+
+class Snapshot:
+    """The set of dataset versions a session reads from, plus everything derived from them."""
+
+    def __init__(self, datasets: dict):
+        self.datasets = datasets
+        self.version = "-".join(datasets[name].version for name in sorted(datasets))
+        self._derived = {}
+        self._building = {}  # key -> lock held while that value is built
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name) -> pd.DataFrame:
+        return self.datasets[name].frame
+
+    def derived(self, key, builder):
+        # Computed once per snapshot; every session reading this snapshot gets the same object.
+        # Only sessions asking for the same key wait for a build, built values are read without a lock.
+        if key in self._derived:
+            return self._derived[key]
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            if key not in self._derived:
+                self._derived[key] = builder(self)
+        with self._lock:
+            self._building.pop(key, None)
+        return self._derived[key]
+
+
+class DatasetStore:
+    """Process wide, read-only store of the dashboard data. Memory grows with datasets, not sessions.
+
+    With the watcher running (start()), changed files are loaded by a background thread: the
+    new snapshot is built and warmed with warm(snapshot) while sessions keep reading the old
+    one, then swapped in with a single assignment. Sessions get it on their next rerun, and
+    an old snapshot is freed when the last session holding it reruns, closes or expires.
+    """
+
+    def __init__(self, sources=DATASETS, warm=None):
+        self.sources = sources
+        self.warm = warm
+        self.current = None
+        self.reloads = []  # {"version", "finished", "load seconds", "warm seconds"} of the recent loads
+        self.error = None  # last failed load, cleared by the next successful one
+        self._sessions = {}  # session id -> (snapshot, last seen)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one load at a time
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _fingerprints(self):
+        return {name: source_fingerprint(resolve_source(path), sheet) for name, (path, sheet, _) in self.sources.items()}
+
+    def _changed(self, fingerprints) -> bool:
+        return self.current is None or any(self.current.datasets[name].version != fp for name, fp in fingerprints.items())
+
+    def _load(self, fingerprints) -> Snapshot:
+        # Unchanged datasets are reused from the current snapshot, so they are never held twice
+        previous = self.current.datasets if self.current else {}
+        datasets = {}
+        for name, (path, sheet, prepare) in self.sources.items():
+            if name in previous and previous[name].version == fingerprints[name]:
+                datasets[name] = previous[name]
+                continue
+            frame = load_table(resolve_source(path), sheet)
+            if prepare is not None:
+                frame = prepare(frame)
+            datasets[name] = Dataset(name, fingerprints[name], frame)
+        return Snapshot(datasets)
+
+    def refresh(self, fingerprints=None, warm=True) -> Snapshot:
+        """Loads the files that changed into a new current snapshot. Sessions are not blocked meanwhile."""
+        with self._load_lock:
+            fingerprints = fingerprints or self._fingerprints()
+            if self._changed(fingerprints):
+                start = time.perf_counter()
+                snapshot = self._load(fingerprints)
+                loaded = time.perf_counter()
+                # Nobody reads the new snapshot yet, so warming it does not hold up any rerun
+                if warm and self.warm is not None:
+                    self.warm(snapshot)
+                with self._lock:
+                    self.current = snapshot
+                self.error = None
+                self.reloads = self.reloads[-9:] + [{"version": snapshot.version, "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                                                     "load seconds": round(loaded - start, 2), "warm seconds": round(time.perf_counter() - loaded, 2)}]
+            return self.current
+
+    def watching(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def acquire(self, session_id) -> Snapshot:
+        """Snapshot for this rerun. The session holds it until its next rerun or until it expires."""
+        snapshot = self.current
+        if snapshot is None or not self.watching():
+            # The first load is not warmed, the first visitor builds what the page needs anyway
+            snapshot = self.refresh(warm=self.current is not None)
+        with self._lock:
+            self._sessions[session_id] = (snapshot, time.monotonic())
+            self._prune()
+        return snapshot
+
+    def _prune(self):
+        # Old snapshots are only referenced from here, dropping the sessions frees them
+        cutoff = time.monotonic() - SESSION_TTL
+        closed = set()
+        if Runtime.exists():
+            runtime = Runtime.instance()
+            closed = {s for s in self._sessions if not runtime.is_active_session(s)}
+        for session_id in [s for s, (_, seen) in self._sessions.items() if seen < cutoff or s in closed]:
+            del self._sessions[session_id]
+
+    def _watch(self, interval):
+        pending = None
+        while not self._stop.wait(interval):
+            with self._lock:
+                self._prune()
+            try:
+                fingerprints = self._fingerprints()
+            except OSError:
+                continue  # a file is being replaced right now
+            if not self._changed(fingerprints) or fingerprints == self.error:
+                pending = None
+                continue
+            if fingerprints != pending:
+                # Files are often copied in several steps: load once they stop changing
+                pending = fingerprints
+                continue
+            try:
+                self.refresh(fingerprints)
+            except Exception:
+                # Kept until the files change again, the current snapshot stays in use
+                self.error = fingerprints
+                logger.exception("Dataset reload failed, the previous version stays in use")
+            pending = None
+
+    def start(self, interval=WATCH_SECONDS):
+        """Starts the background watcher. Sessions then never wait for a reload."""
+        if not self.watching():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, args=(interval,), name="dataset-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> pd.DataFrame:
+        """Bytes and number of sessions per loaded dataset version."""
+        with self._lock:
+            snapshots = [snapshot for snapshot, _ in self._sessions.values()]
+            if self.current is not None:
+                snapshots.append(self.current)
+            rows = {}
+            for snapshot in snapshots:
+                for dataset in snapshot.datasets.values():
+                    rows.setdefault(id(dataset), {"dataset": dataset.name, "version": dataset.version, "bytes": dataset.nbytes, "sessions": 0,
+                                                  "current": dataset is self.current.datasets.get(dataset.name)})
+            for snapshot, _ in self._sessions.values():
+                for dataset in snapshot.datasets.values():
+                    rows[id(dataset)]["sessions"] += 1
+        return pd.DataFrame(list(rows.values()), columns=["dataset", "version", "bytes", "sessions", "current"])
+
+
+@st.cache_resource
+def get_store() -> DatasetStore:
+    # Imported here, the warm-up uses the chart modules which import this one
+    from utils.warmup import warm
+    return DatasetStore(warm=warm).start()
+
+
+def session_id() -> str:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
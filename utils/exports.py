@@ -0,0 +1,126 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+
+# Upper bound for the serialized downloads kept in memory by this process
+CACHE_BYTES = 64 * 1024 * 1024
+
+
+def _xlsx(df: pd.DataFrame) -> bytes:
+    output = BytesIO()
+    writer = pd.ExcelWriter(output, engine='xlsxwriter')
+    df.to_excel(writer, sheet_name='Sheet1')
+    writer.close()
+    return output.getvalue()
+
+
+def _csv(df: pd.DataFrame) -> bytes:
+    return df.to_csv().encode("utf-8")
+
+
+def _parquet(df: pd.DataFrame) -> bytes:
+    output = BytesIO()
+    df.to_parquet(output)
+    return output.getvalue()
+
+
+# format: (serializer, file extension, mime type). csv and parquet are much cheaper to build than xlsx.
+FORMATS = {
+    "xlsx": (_xlsx, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": (_csv, "csv", "text/csv"),
+    "parquet": (_parquet, "parquet", "application/octet-stream"),
+}
+
+
+class ByteCache:
+    """LRU of serialized downloads, bounded by their total size."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data: bytes):
+        with self._lock:
+            if key in self._items or len(data) > self.max_bytes:
+                return
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self.size -= len(old)
+
+
+_cache = ByteCache()
+
+
+def content_key(df: pd.DataFrame, fmt: str) -> str:
+    # Hashing the frame is far cheaper than building a workbook, so equal slices share one export
+    digest = hashlib.sha1(fmt.encode("utf-8"))
+    digest.update(repr(list(df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def export_bytes(df: pd.DataFrame, fmt="csv", key=None) -> bytes:
+    """df serialized as csv, xlsx or parquet. Only built when this exact content was not exported before.
+
+    key identifies the content when the caller knows it (dataset version, filters), which saves hashing df.
+    """
+    key = (key, fmt) if key is not None else content_key(df, fmt)
+    data = _cache.get(key)
+    if data is None:
+        data = FORMATS[fmt][0](df)
+        _cache.put(key, data)
+    return data
+
+
+def download_button(data, label, file_stem, key=None, formats=("csv", "xlsx", "parquet"), cache_key=None, **kwargs) -> bool:
+    """st.download_button with a format choice, served from the export cache.
+
+    data is a DataFrame, or a function returning one for large downloads. The function is only
+    called, and the file only built, after the user presses "Prepare download" for a format;
+    until the file name or format changes the prepared file is then served from the cache
+    under cache_key.
+    """
+    key = key or file_stem
+    fmt = formats[0]
+    if len(formats) > 1:
+        fmt = st.radio("Format", formats, horizontal=True, key=f"{key}-format", label_visibility="collapsed")
+    _, extension, mime = FORMATS[fmt]
+    if callable(data):
+        prepared = f"{key}-prepared"
+        if st.session_state.get(prepared) != (file_stem, fmt):
+            if not st.button(f"Prepare download (.{extension})", key=f"{key}-prepare", **kwargs):
+                return False
+            st.session_state[prepared] = (file_stem, fmt)
+        data = data()
+    return st.download_button(
+        label=f"{label} (.{extension})",
+        data=export_bytes(data, fmt, cache_key),
+        file_name=f"{file_stem}.{extension}",
+        mime=mime,
+        key=key,
+        **kwargs,
+    )
+
+
+def cache_stats() -> dict:
+    return {"entries": len(_cache._items), "bytes": _cache.size, "hits": _cache.hits, "misses": _cache.misses}
@@ -0,0 +1,62 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from utils.cube import PatentCube
+from utils.dataset_store import TECH_NAMES
+
+# Stacking order of the focus areas in the chart (and their position in the "order" column)
+AREA_ORDER = ['Nature', 'Air', 'Water', 'Climate', 'Waste, Resources & Materials']
+AREA_COLUMN = {name: col for col, name in TECH_NAMES.items()}
+
+
+class FocusAreaIndex:
+    """Focus-area breakdown per country for any subset of areas, absolute and normalized.
+
+    Each query is a reduction of the patent cube plus one sort of ~90 countries. The
+    long-format slices the chart asks for are memoized in a bounded LRU.
+    """
+
+    def __init__(self, cube: PatentCube, maxsize=256):
+        self.cube = cube
+        self.query = functools.lru_cache(maxsize=maxsize)(self._query)
+
+    @staticmethod
+    def key(selected) -> tuple:
+        # The selection order in the multiselect does not change the result
+        return tuple(area for area in AREA_ORDER if area in selected)
+
+    def _query(self, areas: tuple, normalized: bool, country=None, k=6, n=10, years=None) -> pd.DataFrame:
+        cube = self.cube
+        values = cube.by_area(years, [AREA_COLUMN[area] for area in areas]).astype(np.float64)
+        rows = np.flatnonzero(cube.included)
+        if normalized:
+            values = cube.per_100k(values)
+            rows = rows[cube.has_population()[rows]]
+        # Stable sort, countries with the same total keep their alphabetical order
+        rows = rows[np.argsort(-values[rows].sum(axis=1), kind="stable")]
+        if country is not None:
+            stop = int(np.flatnonzero(rows == cube.index(country))[0]) + k
+        else:
+            stop = max(int(n), 0)
+        rows = rows[:stop]
+
+        long = pd.DataFrame({
+            "country": np.repeat(cube.countries[rows], len(areas)),
+            "tech": np.tile(np.array(areas, dtype=object), len(rows)),
+            "patents": values[rows].ravel(),
+        })
+        return long.assign(order=long['tech'].map({val: i for i, val in enumerate(AREA_ORDER)}))
+
+    def breakdown(self, selected, normalized, country=None, k=6, n=10, years=None) -> pd.DataFrame:
+        """Long-format (country, tech, patents, order) rows for the selected areas, in the (first, last) years.
+
+        With a country: every country ranked above it, the country and k - 1 after it.
+        Without: the top n countries. Shared between sessions, do not modify the result.
+        """
+        if country is not None:
+            n = None  # not part of the result, keep it out of the cache key
+        else:
+            k = None
+        return self.query(self.key(selected), bool(normalized), country, k, n, tuple(years) if years else None)
@@ -0,0 +1,237 @@
+import argparse
+import os
+import re
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.data_loader import CACHE_SUFFIX, read_cache, write_cache
+from utils.streaming_ingest import READERS, peak_rss_mb
+
+# Abstracts are about 1 kB each, so chunks are smaller than for the raw extract
+CHUNK_SIZE = 5_000
+
+# Text columns of PATSTAT's tls202_appln_title and tls203_appln_abstr -> match flag written for them
+TEXT_COLUMNS = {"appln_title": "title_match", "appln_abstract": "abstract_match"}
+MATCH_COLUMN = "keyword_match"  # keyword in the title or the abstract
+
+# A keyword matches whole words; "*" at either end also matches longer words ("purif*")
+WILDCARD = "*"
+# Letters NFKD does not split into a base letter and a diacritic
+_FOLD = {"ø": "o", "æ": "ae", "œ": "oe", "ł": "l", "đ": "d", "ð": "d", "þ": "th", "ı": "i"}
+_FOLD_PATTERN = re.compile("[" + "".join(_FOLD) + "]")
+# The blocks of combining diacritical marks, removed after NFKD has split them off.
+# re.sub is several times faster than str.translate on non-ASCII text.
+_MARKS = re.compile("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]+")
+
+
+def normalize_text(text) -> str:
+    """Case and diacritics removed, runs of whitespace collapsed: "Spildevands-Rensning" -> "spildevands-rensning"."""
+    text = str(text).casefold()
+    if not text.isascii():
+        text = _FOLD_PATTERN.sub(lambda m: _FOLD[m.group()], text)
+        text = _MARKS.sub("", unicodedata.normalize("NFKD", text))
+    return " ".join(text.split())
+
+
+def read_keywords(path) -> list:
+    # One keyword or phrase per line, lines starting with # are comments
+    with open(path, encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip() and not line.lstrip().startswith("#")]
+
+
+class KeywordMatcher:
+    """The keywords compiled into one Aho-Corasick automaton.
+
+    The automaton is turned into a full transition table (state -> {character: next state}),
+    so a text is scanned once with one dictionary lookup per character, however many keywords
+    there are. Keywords and texts are normalized the same way (normalize_text).
+    """
+
+    def __init__(self, keywords):
+        self.keywords = []
+        goto = [{}]
+        outputs = [[]]  # state -> (keyword number, length, left wildcard, right wildcard) ending there
+        for keyword in keywords:
+            word = normalize_text(keyword.strip(WILDCARD))
+            if not word:
+                continue
+            state = 0
+            for ch in word:
+                if ch not in goto[state]:
+                    goto[state][ch] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = goto[state][ch]
+            outputs[state].append((len(self.keywords), len(word), keyword.startswith(WILDCARD), keyword.endswith(WILDCARD)))
+            self.keywords.append(keyword)
+
+        # Breadth first, so the failure state of a state (a shorter suffix) is complete before it
+        fail = [0] * len(goto)
+        delta = [dict(transitions) for transitions in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0) if state else 0
+                queue.append(child)
+            if state:
+                outputs[state] = outputs[state] + outputs[fail[state]]
+                for ch, target in delta[fail[state]].items():
+                    delta[state].setdefault(ch, target)
+        self._delta = delta
+        self._outputs = [tuple(output) for output in outputs]
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def find(self, text, first=False) -> list:
+        """(start, keyword) of every match in an already normalized text, or only the first one."""
+        delta, outputs = self._delta, self._outputs
+        found = []
+        state = 0
+        for end, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if not outputs[state]:
+                continue
+            for keyword, length, left, right in outputs[state]:
+                start = end - length + 1
+                # Whole words only, unless the keyword has a wildcard on that side
+                if not left and start > 0 and text[start - 1].isalnum():
+                    continue
+                if not right and end + 1 < len(text) and text[end + 1].isalnum():
+                    continue
+                found.append((start, self.keywords[keyword]))
+                if first:
+                    return found
+        return found
+
+    def matches(self, text) -> bool:
+        return bool(self.find(normalize_text(text), first=True))
+
+
+def match_texts(matcher: KeywordMatcher, texts) -> np.ndarray:
+    # Missing titles and abstracts do not match
+    return np.fromiter((isinstance(text, str) and matcher.matches(text) for text in texts), dtype=bool, count=len(texts))
+
+
+# The matcher of a pool worker, compiled once when the worker starts
+_matcher = None
+
+
+def _start_worker(keywords):
+    global _matcher
+    _matcher = KeywordMatcher(keywords)
+
+
+def _match_chunk(texts) -> np.ndarray:
+    return match_texts(_matcher, texts)
+
+
+def iter_arrow_chunks(path, sheet_name=None, chunk_size=CHUNK_SIZE):
+    # Memory-mapped, only the slice being converted is copied
+    table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    for offset in range(0, table.num_rows, chunk_size):
+        yield table.slice(offset, chunk_size).to_pandas()
+
+
+CHUNK_READERS = {**READERS, CACHE_SUFFIX: iter_arrow_chunks}
+
+
+def match_file(source, keywords, sheet_name="Sheet1", chunk_size=CHUNK_SIZE, workers=None, pri=False) -> pd.DataFrame:
+    """Keyword flags for the applications of a title or abstract file (appln_id plus TEXT_COLUMNS).
+
+    The file is read one chunk at a time and the chunks are matched by a pool of worker
+    processes (workers=1 matches in this process). At most two chunks per worker are in flight,
+    so memory stays flat for any file size. Returns appln_id and one flag column per text
+    column of the file.
+    """
+    source = Path(source)
+    reader = CHUNK_READERS.get(source.suffix.lower())
+    if reader is None:
+        raise ValueError(f"Cannot read {source.suffix} files, expected one of {', '.join(CHUNK_READERS)}")
+    workers = workers or os.cpu_count() or 1
+    keywords = list(keywords)
+
+    start = time.perf_counter()
+    results = []
+    texts = 0
+
+    def collect(ids, flags):
+        nonlocal texts
+        results.append(pd.DataFrame({"appln_id": ids, **flags}))
+        texts += len(ids)
+        if pri:
+            print(f"{texts:,} texts, {texts / (time.perf_counter() - start):,.0f} texts/s, peak RSS {peak_rss_mb():,.0f} MB")
+
+    def columns(chunk):
+        return [col for col in TEXT_COLUMNS if col in chunk.columns]
+
+    if workers == 1:
+        _start_worker(keywords)
+        for chunk in reader(source, sheet_name, chunk_size):
+            collect(chunk["appln_id"].to_numpy(), {TEXT_COLUMNS[col]: _match_chunk(chunk[col].tolist()) for col in columns(chunk)})
+    else:
+        with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(keywords,)) as pool:
+            pending = deque()
+            for chunk in reader(source, sheet_name, chunk_size):
+                pending.append((chunk["appln_id"].to_numpy(), {TEXT_COLUMNS[col]: pool.submit(_match_chunk, chunk[col].tolist()) for col in columns(chunk)}))
+                while len(pending) > 2 * workers or (pending and all(f.done() for f in pending[0][1].values())):
+                    ids, futures = pending.popleft()
+                    collect(ids, {flag: future.result() for flag, future in futures.items()})
+            while pending:
+                ids, futures = pending.popleft()
+                collect(ids, {flag: future.result() for flag, future in futures.items()})
+
+    if not results:
+        raise ValueError(f"{source} has no rows")
+    flags = pd.concat(results, ignore_index=True)
+    # An application can have several titles or abstracts (one per language)
+    return flags.groupby("appln_id", sort=True).any().reset_index()
+
+
+def add_flags(labels: pd.DataFrame, flags) -> pd.DataFrame:
+    """The class-based labels of utils.classifier with the keyword flags next to them.
+
+    Applications without a title or abstract in the flag files get False.
+    """
+    for frame in flags:
+        labels = labels.merge(frame, on="appln_id", how="left")
+    flag_columns = [col for col in [*TEXT_COLUMNS.values(), MATCH_COLUMN] if col in labels.columns]
+    labels[flag_columns] = labels[flag_columns].fillna(False).astype(bool)
+    labels[MATCH_COLUMN] = labels[[col for col in TEXT_COLUMNS.values() if col in labels.columns]].any(axis=1)
+    return labels
+
+
+# python -m utils.keywords water_keywords.txt tls202_appln_title.csv tls203_appln_abstr.csv --labels data/build/focus_areas.arrow
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag applications whose title or abstract contains one of the keywords.")
+    parser.add_argument("keywords", help="Keyword file, one keyword or phrase per line, '*' at either end for truncation")
+    parser.add_argument("sources", nargs="+", help="appln_id plus appln_title and/or appln_abstract, .csv/.xlsx/.xlsb/.arrow")
+    parser.add_argument("--labels", help="Focus areas written by utils.classifier, the flags are added next to them")
+    parser.add_argument("--out", help="Output file (default: the labels file, or keyword_matches.arrow next to the first source)")
+    parser.add_argument("--sheet", default="Sheet1")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    keywords = read_keywords(args.keywords)
+    flags = []
+    for source in args.sources:
+        start = time.perf_counter()
+        flags.append(match_file(source, keywords, args.sheet, args.chunk_size, args.workers, pri=True))
+        seconds = time.perf_counter() - start
+        print(f"{source}: {len(flags[-1]):,} applications in {seconds:.1f}s ({len(flags[-1]) / seconds:,.0f}/s)")
+    if args.labels:
+        result = add_flags(read_cache(Path(args.labels)), flags)
+    else:
+        result = add_flags(pd.DataFrame({"appln_id": pd.concat([f["appln_id"] for f in flags]).unique()}), flags)
+    target = Path(args.out or args.labels or Path(args.sources[0]).with_name("keyword_matches" + CACHE_SUFFIX))
+    write_cache(result, target)
+    print(f"{int(result[MATCH_COLUMN].sum()):,} of {len(result):,} applications match a keyword -> {target}")
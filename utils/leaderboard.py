@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+# Rows per page of the company table. Fixed, so the payload sent to the browser is bounded.
+PAGE_SIZE = 25
+
+
+def rank(country: np.ndarray, counts: np.ndarray) -> tuple:
+    """Order that sorts rows by country, then by counts descending, and the rank of each sorted row.
+
+    Rows with the same counts keep their order (by name in the leaderboard) and share the best rank.
+    """
+    n = len(counts)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    order = np.lexsort((-counts, country))
+    country, counts = country[order], counts[order]
+    position = np.arange(n)
+    first = np.r_[True, country[1:] != country[:-1]]
+    first_of_tie = first | np.r_[True, counts[1:] != counts[:-1]]
+    country_start = np.maximum.accumulate(np.where(first, position, 0))
+    tie_start = np.maximum.accumulate(np.where(first_of_tie, position, 0))
+    return order, tie_start - country_start + 1
+
+
+class Leaderboard:
+    """Applicants of every country with their applications per publication year.
+
+    Built once per dataset version. The (country, applicant) pairs are sorted by country and
+    name, so each country is a contiguous block, and hold cumulative counts over the years like
+    utils.cube.PatentCube: the counts of any year range are the difference of two columns.
+    Only the block of the country shown is ranked for a range.
+    """
+
+    def __init__(self, rådata: pd.DataFrame):
+        raw = rådata[rådata["earliest_publn_year"].notna()]
+        self.years = np.sort(raw["earliest_publn_year"].unique().astype(np.int64))
+        country = raw["person_ctry_code"].astype("category")
+        name = raw["psn_name"].astype("category")
+        country_codes, name_codes = country.cat.codes.to_numpy(np.int64), name.cat.codes.to_numpy(np.int64)
+        year = np.searchsorted(self.years, raw["earliest_publn_year"].to_numpy())
+
+        # Applications without a country or an applicant are left out
+        valid = (country_codes >= 0) & (name_codes >= 0)
+        n_names = len(name.cat.categories)
+        pair, keys = pd.factorize(country_codes[valid] * n_names + name_codes[valid])
+        counts = np.bincount(pair * len(self.years) + year[valid], minlength=len(keys) * len(self.years)).reshape(len(keys), len(self.years))
+
+        pairs = pd.DataFrame({"country": np.asarray(country.cat.categories.astype(str))[keys // n_names],
+                              "name": np.asarray(name.cat.categories.astype(str))[keys % n_names]})
+        order = pairs.sort_values(["country", "name"], kind="mergesort").index.to_numpy()
+        countries = pairs["country"].to_numpy()[order]
+        self._countries = countries
+        self._names = pairs["name"].to_numpy()[order]
+        # Cumulative sums over the year axis with a leading zero: years lo..hi = cum[:, hi + 1] - cum[:, lo]
+        self._cum = np.pad(counts[order].cumsum(axis=1, dtype=np.int32), ((0, 0), (1, 0)))
+
+        # Block of each country in the sorted arrays
+        starts = np.flatnonzero(np.r_[True, countries[1:] != countries[:-1]]) if len(countries) else np.zeros(0, dtype=np.int64)
+        stops = np.r_[starts[1:], len(countries)]
+        self._blocks = {countries[start]: (start, stop) for start, stop in zip(starts, stops)}
+        self._country_codes = np.repeat(np.arange(len(starts)), stops - starts)
+
+        # Rank in the country over all years, for the company search
+        self._totals = self._cum[:, -1]
+        order, ranks = rank(self._country_codes, self._totals)
+        self._ranks = np.empty_like(ranks)
+        self._ranks[order] = ranks
+
+        self._last = None  # (country, lo, hi) and positions, counts and ranks of the last range ranked
+
+    def year_bounds(self, years=None) -> tuple:
+        # As PatentCube.year_bounds: hi < lo when no year falls in the range
+        if years is None:
+            return 0, len(self.years) - 1
+        first, last = years
+        return int(np.searchsorted(self.years, first, "left")), int(np.searchsorted(self.years, last, "right")) - 1
+
+    def _ranked(self, country, years=None) -> tuple:
+        """Positions, counts and ranks of the country's applicants with applications in the years, best first."""
+        lo, hi = self.year_bounds(years)
+        key = (country, lo, hi)
+        last = self._last
+        if last is not None and last[0] == key:
+            return last[1]
+        start, stop = self._blocks.get(country, (0, 0))
+        counts = self._cum[start:stop, hi + 1] - self._cum[start:stop, lo] if hi >= lo else np.zeros(0, dtype=np.int32)
+        positions = start + np.flatnonzero(counts > 0)
+        counts = counts[counts > 0]
+        order, ranks = rank(np.zeros(len(counts), dtype=np.int64), counts)
+        result = (positions[order], counts[order], ranks)
+        # Page, total and download of one rerun ask for the same range; one tuple assignment is thread safe
+        self._last = (key, result)
+        return result
+
+    def countries(self):
+        return list(self._blocks)
+
+    def total(self, country, years=None) -> int:
+        """Number of applicants in the country with applications in the years."""
+        return len(self._ranked(country, years)[0])
+
+    def pages(self, country, years=None, page_size=PAGE_SIZE) -> int:
+        return max(1, -(-self.total(country, years) // page_size))
+
+    def _frame(self, positions, counts, ranks) -> pd.DataFrame:
+        return pd.DataFrame({"rank": ranks, "company": self._names[positions], "patents": counts})
+
+    def page(self, country, page=1, years=None, page_size=PAGE_SIZE) -> pd.DataFrame:
+        """Rows of the 1-based page, clamped to the pages that exist."""
+        positions, counts, ranks = self._ranked(country, years)
+        page = min(max(int(page), 1), self.pages(country, years, page_size))
+        window = slice((page - 1) * page_size, page * page_size)
+        return self._frame(positions[window], counts[window], ranks[window])
+
+    def country_frame(self, country, years=None) -> pd.DataFrame:
+        """The full list of a country, for downloads."""
+        return self._frame(*self._ranked(country, years))
+
+    def rows(self, positions=None) -> pd.DataFrame:
+        """company, country, rank and patents over all years of positions in the sorted arrays (default every row)."""
+        positions = slice(None) if positions is None else positions
+        return pd.DataFrame({"company": self._names[positions], "country": self._countries[positions],
+                             "rank": self._ranks[positions], "patents": self._totals[positions]})
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self._cum, self._ranks, self._country_codes))
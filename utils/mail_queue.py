@@ -0,0 +1,277 @@
+import argparse
+import logging
+import smtplib
+import socketserver
+import sqlite3
+import ssl
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+import streamlit as st
+
+OUTBOX_PATH = Path("./assets/outbox.sqlite3")
+
+logger = logging.getLogger(__name__)
+
+# Used when .streamlit/secrets.toml does not say otherwise. For a local stand-in set
+# smtp_host = "localhost", smtp_port = 1025 and smtp_starttls = false (see the sink below).
+SMTP_DEFAULTS = {
+    "smtp_host": "smtp.office365.com",
+    "smtp_port": 587,
+    "smtp_starttls": True,
+    "sender_email": "noreply@cleancluster.dk",
+    "server_password": None,
+}
+
+BATCH_SIZE = 50  # messages claimed per round, all sent over one connection
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30  # wait before retry n is BACKOFF_SECONDS * 2**(n-1), at most MAX_BACKOFF_SECONDS
+MAX_BACKOFF_SECONDS = 60 * 60
+POLL_SECONDS = 10  # how often the worker looks for due retries when nobody wakes it
+IDLE_SECONDS = 60  # an unused SMTP connection is closed after this long
+STALE_SECONDS = 10 * 60  # messages left "sending" by a crashed worker are queued again after this long
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, sending, sent or failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+"""
+
+
+def mail_settings() -> dict:
+    settings = dict(SMTP_DEFAULTS)
+    try:
+        settings.update({key: st.secrets[key] for key in SMTP_DEFAULTS if key in st.secrets})
+    except FileNotFoundError:
+        pass  # no secrets.toml, e.g. when running locally
+    return settings
+
+
+def backoff(attempts) -> float:
+    return min(BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), MAX_BACKOFF_SECONDS)
+
+
+class MailQueue:
+    """Persistent outbox of mails, delivered by a background thread.
+
+    enqueue() only inserts a row, so the script run never waits for the mail server. The
+    worker sends due messages in batches over one reused SMTP connection and retries failed
+    ones with exponential backoff. The outbox survives restarts; unsent mails are picked up
+    by the next worker.
+    """
+
+    def __init__(self, path=OUTBOX_PATH, settings=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.settings = settings or mail_settings()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._server = None
+        self._last_used = 0.0
+        self._thread = None
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def enqueue(self, recipient, subject, html) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (recipient, subject, html, next_attempt, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (recipient, subject, html, now, now, now))
+        self._wake.set()
+        return cursor.lastrowid
+
+    def status(self, mail_id) -> dict:
+        rows = self._execute("SELECT recipient, status, attempts, last_error, next_attempt FROM outbox WHERE id = ?", (mail_id,))
+        if not rows:
+            return None
+        recipient, status, attempts, last_error, next_attempt = rows[0]
+        return {"recipient": recipient, "status": status, "attempts": attempts, "last_error": last_error, "next_attempt": next_attempt}
+
+    def recent(self, n=20) -> list:
+        rows = self._execute("SELECT id, recipient, subject, status, attempts, last_error, created, updated FROM outbox ORDER BY id DESC LIMIT ?", (n,))
+        return [{"id": id_, "recipient": recipient, "subject": subject, "status": status, "attempts": attempts,
+                 "last error": last_error or "", "queued": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)),
+                 "updated": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(updated))}
+                for id_, recipient, subject, status, attempts, last_error, created, updated in rows]
+
+    def counts(self) -> dict:
+        return dict(self._execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+
+    def _claim(self) -> list:
+        # Marks a batch of due messages as "sending" in one transaction, so two workers never send the same mail
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE outbox SET status = 'queued', updated = ? WHERE status = 'sending' AND updated < ?",
+                                   (now, now - STALE_SECONDS))
+                rows = self._conn.execute(
+                    "SELECT id, recipient, subject, html, attempts FROM outbox WHERE status = 'queued' AND next_attempt <= ? ORDER BY id LIMIT ?",
+                    (now, BATCH_SIZE)).fetchall()
+                self._conn.executemany("UPDATE outbox SET status = 'sending', updated = ? WHERE id = ?", [(now, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _done(self, mail_id):
+        self._execute("UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL, updated = ? WHERE id = ?", (time.time(), mail_id))
+
+    def _failed(self, mail_id, attempts, error):
+        now = time.time()
+        status = "failed" if attempts >= MAX_ATTEMPTS else "queued"
+        self._execute("UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt = ?, updated = ? WHERE id = ?",
+                      (status, attempts, str(error)[:500], now + backoff(attempts), now, mail_id))
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._server is not None:
+            # Checked with a NOOP only after a pause; within a batch the connection is just reused
+            if time.time() - self._last_used < 5:
+                return self._server
+            try:
+                self._server.noop()
+                return self._server
+            except (smtplib.SMTPException, OSError):
+                self._close()
+        settings = self.settings
+        server = smtplib.SMTP(settings["smtp_host"], int(settings["smtp_port"]), timeout=30)
+        if settings["smtp_starttls"]:
+            server.starttls(context=ssl.create_default_context())
+        if settings["server_password"]:
+            server.login(settings["sender_email"], settings["server_password"])
+        self._server = server
+        return server
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def _message(self, recipient, subject, html) -> str:
+        message = MIMEMultipart()
+        message["From"] = self.settings["sender_email"]
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.attach(MIMEText(html, "html"))
+        return message.as_string()
+
+    def deliver(self) -> int:
+        """Sends one batch of due messages. Returns how many were sent."""
+        batch = self._claim()
+        sent = 0
+        for position, (mail_id, recipient, subject, html, attempts) in enumerate(batch):
+            try:
+                self._connection().sendmail(self.settings["sender_email"], recipient, self._message(recipient, subject, html))
+            except (smtplib.SMTPException, OSError) as e:
+                self._failed(mail_id, attempts + 1, e)
+                if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                    # The server or the connection is the problem, the rest of the batch waits for the retry
+                    self._close()
+                    for mail_id, _, _, _, attempts in batch[position + 1:]:
+                        self._failed(mail_id, attempts, "Not sent, an earlier message in the batch failed")
+                    break
+            else:
+                self._done(mail_id)
+                self._last_used = time.time()
+                sent += 1
+        return sent
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.deliver() == BATCH_SIZE:
+                    continue  # more may be waiting
+            except Exception:
+                logger.exception("Mail worker failed, retrying")
+            if self._server is not None and time.time() - self._last_used > IDLE_SECONDS:
+                self._close()
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+        self._close()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+@st.cache_resource
+def get_mail_queue() -> MailQueue:
+    # One worker per process
+    return MailQueue().start()
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: accepts every message and prints its headers
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 localhost SMTP sink")
+        while True:
+            line = self.rfile.readline().decode(errors="replace").strip()
+            if not line:
+                return
+            command = line.split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while (data := self.rfile.readline().decode(errors="replace").rstrip("\r\n")) != ".":
+                    lines.append(data)
+                if self.server.fail_next > 0:
+                    self.server.fail_next -= 1
+                    self.reply("451 Try again later")
+                    continue
+                headers = [data for data in lines if data.split(":", 1)[0] in ("To", "Subject")]
+                print(f"{time.strftime('%H:%M:%S')} received {len(lines)} lines: {', '.join(headers)}")
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+# A local stand-in for the mail server: python -m utils.mail_queue --port 1025 [--fail 3]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local SMTP sink that prints every mail it receives.")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--fail", type=int, default=0, help="Reject this many messages first, to try the retries")
+    args = parser.parse_args()
+    with socketserver.ThreadingTCPServer(("localhost", args.port), _SinkHandler) as server:
+        server.fail_next = args.fail
+        print(f"SMTP sink on localhost:{args.port}")
+        server.serve_forever()
@@ -0,0 +1,36 @@
+import numpy as np
+
+from utils.cube import PatentCube
+
+
+def summarize(cube: PatentCube, years=None) -> dict:
+    """All headline numbers of the dashboard for the (first, last) publication years, None for all.
+
+    Computed once per dataset version and year range from the cumulative sums of the cube.
+
+    Returns the totals for the "Key metrics" block and a per-country lookup with
+    companies, patents and patents per 100.000 inhabitants.
+    """
+    patents = cube.patents(years)
+    companies = cube.companies(years)
+    per_100k = cube.per_100k(patents.astype(np.float64))
+    areas = cube.by_area(years).sum(axis=0)
+
+    by_country = {
+        country: {"companies": int(companies[i]), "patents": int(patents[i]),
+                  "per_100k": None if np.isnan(per_100k[i]) else float(per_100k[i])}
+        for i, country in enumerate(cube.countries)
+    }
+    return {
+        "patents": int(patents.sum()),
+        "countries": int(np.count_nonzero(patents)),
+        "companies": cube.all_companies(years),
+        "areas": {col: int(n) for col, n in zip(cube.areas, areas)},
+        # Every country the charts can show (included, with a population), so the selection does not change with the years
+        "country_list": list(cube.countries[cube.included & cube.has_population()]),
+        "by_country": by_country,
+    }
+
+
+def country_summary(summary: dict, country) -> dict:
+    return summary["by_country"].get(country, {"companies": 0, "patents": 0, "per_100k": None})
@@ -0,0 +1,42 @@
+import pandas as pd
+
+
+class RankingIndex:
+    """Countries pre-sorted by each metric, plus a country -> rank lookup.
+
+    Built once per dataset version. "Top N" and "up to the selected country + k"
+    are then a dictionary lookup and a slice of the pre-sorted frame.
+    """
+
+    def __init__(self, df: pd.DataFrame, key: str, metrics):
+        self.key = key
+        self._sorted = {}
+        self._rank = {}
+        for metric in metrics:
+            # Stable sort, so ties keep the order of the source file on every rebuild
+            ordered = df.sort_values(by=metric, ascending=False, kind="mergesort").reset_index(drop=True)
+            self._sorted[metric] = ordered
+            self._rank[metric] = {value: i for i, value in enumerate(ordered[key])}
+
+    def __contains__(self, value) -> bool:
+        return any(value in ranks for ranks in self._rank.values())
+
+    def sorted(self, metric) -> pd.DataFrame:
+        return self._sorted[metric]
+
+    def rank(self, metric, value) -> int:
+        """0-based position of value when sorted by metric (descending). Raises KeyError when unknown."""
+        return self._rank[metric][value]
+
+    def top(self, metric, n) -> pd.DataFrame:
+        return self._sorted[metric][:max(int(n), 0)]
+
+    def upto(self, metric, value, k) -> pd.DataFrame:
+        """Every row ranked above value, value itself and the k - 1 rows after it."""
+        return self._sorted[metric][:self.rank(metric, value) + k]
+
+    def slice(self, metric, value=None, k=0, n=10) -> pd.DataFrame:
+        # The dashboard either inspects a single country or shows the top n
+        if value is not None:
+            return self.upto(metric, value, k)
+        return self.top(metric, n)
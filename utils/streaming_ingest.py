@@ -0,0 +1,185 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from utils.data_loader import CACHE_SUFFIX, arrow_safe
+
+CHUNK_SIZE = 50_000
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far (0 where the platform does not report it)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def _chunked(header, rows, chunk_size):
+    chunk = []
+    width = len(header)
+    for row in rows:
+        # Sheets without a dimension record leave out the empty cells at the end of a row
+        if len(row) != width:
+            row = (tuple(row) + (None,) * width)[:width]
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield pd.DataFrame.from_records(chunk, columns=header)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame.from_records(chunk, columns=header)
+
+
+def iter_xlsx_chunks(path, sheet_name="Ark1", chunk_size=CHUNK_SIZE):
+    # read_only mode parses the sheet as a stream instead of building the whole workbook in memory
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = [str(col) for col in next(rows)]
+        yield from _chunked(header, rows, chunk_size)
+    finally:
+        wb.close()
+
+
+def iter_xlsb_chunks(path, sheet_name="Ark1", chunk_size=CHUNK_SIZE):
+    from pyxlsb import open_workbook as open_xlsb
+    with open_xlsb(path) as wb:
+        with wb.get_sheet(sheet_name) as sheet:
+            rows = ([cell.v for cell in row] for row in sheet.rows())
+            header = [str(col) for col in next(rows)]
+            yield from _chunked(header, rows, chunk_size)
+
+
+def iter_csv_chunks(path, sheet_name=None, chunk_size=CHUNK_SIZE):
+    yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+READERS = {".xlsx": iter_xlsx_chunks, ".xlsb": iter_xlsb_chunks, ".csv": iter_csv_chunks}
+
+
+def infer_schema(chunk: pd.DataFrame) -> pa.Schema:
+    # Types come from the first chunk. Columns that are still empty there are read as text.
+    schema = pa.Table.from_pandas(arrow_safe(chunk), preserve_index=False).schema
+    return pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema])
+
+
+def widen_schema(chunk: pd.DataFrame, schema: pa.Schema) -> pa.Schema:
+    """The schema widened for the values of this chunk.
+
+    A numeric column with text in this chunk becomes text, like a mixed column in arrow_safe;
+    an integer column with fractions becomes float64.
+    """
+    fields = []
+    for field in schema:
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            values = pd.to_numeric(chunk[field.name], errors="coerce")
+            if (values.isna() & chunk[field.name].notna()).any():
+                field = field.with_type(pa.string())
+            elif pa.types.is_integer(field.type) and (values.dropna() % 1 != 0).any():
+                field = field.with_type(pa.float64())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _rewrite(source, target, schema: pa.Schema):
+    """A writer for target holding the rows of the (finished) file source, cast to schema one batch at a time."""
+    writer = pa.ipc.new_file(str(target), schema)
+    try:
+        with pa.memory_map(str(source)) as file:
+            reader = pa.ipc.open_file(file)
+            for i in range(reader.num_record_batches):
+                writer.write_table(pa.Table.from_batches([reader.get_batch(i)]).cast(schema))
+    except BaseException:
+        writer.close()
+        raise
+    return writer
+
+
+def normalize_chunk(chunk: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Casts one chunk to the file schema (after widen_schema): numbers stay numbers, everything else becomes text."""
+    for field in schema:
+        col = field.name
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            chunk[col] = chunk[col].where(chunk[col].isna(), chunk[col].astype(str))
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+    return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def ingest(source, target, sheet_name="Ark1", chunk_size=CHUNK_SIZE, pri=False) -> dict:
+    """Streams an .xlsx, .xlsb or .csv file into an Arrow IPC file one chunk at a time.
+
+    Only one chunk is held in memory, so the peak stays roughly the same for any input size.
+    Returns rows, seconds, rows/second and peak RSS (MB).
+    """
+    source, target = Path(source), Path(target)
+    reader = READERS.get(source.suffix.lower())
+    if reader is None:
+        raise ValueError(f"Cannot stream {source.suffix} files, expected one of {', '.join(READERS)}")
+
+    start = time.perf_counter()
+    rows = 0
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + f".{os.getpid()}.tmp")
+    writer = None
+    try:
+        for chunk in reader(source, sheet_name, chunk_size):
+            if writer is None:
+                schema = infer_schema(chunk)
+                writer = pa.ipc.new_file(str(tmp), schema)
+            # Types come from the first chunk; a numeric column with text further down becomes text,
+            # an integer column with fractions becomes float
+            wider = widen_schema(chunk, schema)
+            if not wider.equals(schema):
+                # Arrow files cannot be appended to, the rows so far are copied once into a new file
+                writer.close()
+                previous, tmp = tmp, tmp.with_name(tmp.name + ".wide")
+                try:
+                    writer = _rewrite(previous, tmp, wider)
+                finally:
+                    os.remove(previous)
+                schema = wider
+            writer.write_table(normalize_chunk(chunk, schema))
+            rows += len(chunk)
+            if pri:
+                print(f"{rows:,} rows, {rows / (time.perf_counter() - start):,.0f} rows/s, peak RSS {peak_rss_mb():,.0f} MB")
+        if writer is None:
+            raise ValueError(f"{source} has no rows")
+        writer.close()
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0.0, "peak_rss_mb": peak_rss_mb()}
+
+
+def read_ingested(target) -> pd.DataFrame:
+    # Text columns are dictionary encoded before conversion, so pandas gets categoricals and never
+    # holds one Python string per cell
+    table = pa.ipc.open_file(pa.memory_map(str(target))).read_all()
+    columns = [col.dictionary_encode() if pa.types.is_string(col.type) else col for col in table.columns]
+    return pa.table(columns, names=table.column_names).to_pandas()
+
+
+# python -m utils.streaming_ingest "data/Miljøteknologi rådata_new2.xlsx" --sheet Sheet1
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a large .xlsx/.xlsb/.csv extract into a columnar file.")
+    parser.add_argument("source")
+    parser.add_argument("target", nargs="?", help="Output file (default: next to the source with " + CACHE_SUFFIX + ")")
+    parser.add_argument("--sheet", default="Sheet1")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    target = args.target or Path(args.source).with_suffix(CACHE_SUFFIX)
+    report = ingest(args.source, target, args.sheet, args.chunk_size, pri=True)
+    print(f"{report['rows']:,} rows in {report['seconds']:.1f}s ({report['rows_per_second']:,.0f} rows/s), peak RSS {report['peak_rss_mb']:,.0f} MB -> {target}")
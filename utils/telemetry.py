@@ -0,0 +1,213 @@
+import json
+import logging
+import math
+import os
+import resource
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import streamlit as st
+
+# The hidden Admin page and the timing panel are only shown to this user
+ADMIN_NAME = "Emil Hansen"
+
+# Rewritten at most every EXPORT_SECONDS, for a Prometheus node exporter textfile collector or similar
+PROMETHEUS_PATH = Path("./assets/metrics.prom")
+EXPORT_SECONDS = 15
+
+WINDOW = 500  # reruns per section kept for the percentiles
+SESSION_SECONDS = 5 * 60  # a session counts as active when it reran this recently
+
+# One JSON line per rerun at INFO, on stderr. TELEMETRY_LOG_LEVEL=WARNING turns them off
+LOG_LEVEL = os.environ.get("TELEMETRY_LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger(__name__)
+# Streamlit only configures its own loggers, without a handler the lines would be dropped
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def resident_bytes() -> int:
+    """Current RSS of the process. Falls back to the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def quantile(ordered, q) -> float:
+    # Nearest rank of an already sorted list
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)] if ordered else 0.0
+
+
+class Run:
+    """Timing of one script run, split into consecutive sections.
+
+    section(name) ends the running section and starts the next one, so a page is instrumented
+    with one line per section. finish() records the sections and the whole rerun; a run that is
+    stopped early (st.stop, an exception) is not recorded.
+    """
+
+    def __init__(self, telemetry, page, session):
+        self.telemetry = telemetry
+        self.page = page
+        self.session = session
+        self.bytes = 0  # size of the messages sent to the browser so far, counted by the enqueue hook
+        self.sections = []
+        self._start = time.perf_counter()
+        self._current = None
+
+    def section(self, name):
+        self._close()
+        self._current = (name, time.perf_counter(), self.bytes)
+
+    def _close(self):
+        if self._current is not None:
+            name, start, sent = self._current
+            self.sections.append((name, time.perf_counter() - start, self.bytes - sent))
+            self._current = None
+
+    def finish(self):
+        self._close()
+        self.sections.append(("rerun", time.perf_counter() - self._start, self.bytes))
+        self.telemetry.record(self)
+
+
+class Telemetry:
+    """Wall time and bytes sent per page section, over the last WINDOW reruns, for the whole process."""
+
+    def __init__(self, window=WINDOW, path=PROMETHEUS_PATH):
+        self.window = window
+        self.path = Path(path)
+        self._samples = {}  # (page, section) -> deque of (seconds, bytes)
+        self._totals = {}  # (page, section) -> [count, seconds, bytes] since the start
+        self._sessions = {}  # session id -> last rerun
+        self._local = threading.local()  # the run of this script thread
+        self._lock = threading.Lock()
+        self._exported = 0.0
+
+    def start(self, page) -> Run:
+        """Starts timing the run of this script thread. Call once, right after the imports of a page."""
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        run = Run(self, page, ctx.session_id if ctx is not None else "local")
+        self._local.run = run
+        if ctx is not None and not getattr(ctx, "_telemetry_hooked", False) and hasattr(ctx, "_enqueue"):
+            # The context lives as long as the session, so its enqueue is wrapped once
+            enqueue = ctx._enqueue
+
+            def counting_enqueue(msg):
+                current = getattr(self._local, "run", None)
+                if current is not None:
+                    current.bytes += msg.ByteSize()
+                enqueue(msg)
+
+            ctx._enqueue = counting_enqueue
+            ctx._telemetry_hooked = True
+        return run
+
+    def record(self, run: Run):
+        now = time.monotonic()
+        with self._lock:
+            for name, seconds, nbytes in run.sections:
+                key = (run.page, name)
+                self._samples.setdefault(key, deque(maxlen=self.window)).append((seconds, nbytes))
+                totals = self._totals.setdefault(key, [0, 0.0, 0])
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] += nbytes
+            self._sessions[run.session] = now
+            for session in [s for s, seen in self._sessions.items() if seen < now - SESSION_SECONDS]:
+                del self._sessions[session]
+        if getattr(self._local, "run", None) is run:
+            self._local.run = None
+
+        logger.info(json.dumps({"page": run.page, "session": run.session,
+                                "sections": {name: {"ms": round(seconds * 1000, 2), "bytes": nbytes} for name, seconds, nbytes in run.sections},
+                                "rss_bytes": resident_bytes(), "sessions": self.active_sessions()}))
+        if now - self._exported > EXPORT_SECONDS:
+            self._exported = now
+            self.export()
+
+    def active_sessions(self) -> int:
+        cutoff = time.monotonic() - SESSION_SECONDS
+        with self._lock:
+            return sum(seen >= cutoff for seen in self._sessions.values())
+
+    def stats(self) -> list:
+        """p50/p95 wall time and mean bytes sent per page section, over the last reruns."""
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+        rows = []
+        for (page, section), values in samples.items():
+            seconds = sorted(s for s, _ in values)
+            rows.append({"page": page, "section": section, "reruns": len(values),
+                         "p50 ms": round(quantile(seconds, 0.5) * 1000, 1), "p95 ms": round(quantile(seconds, 0.95) * 1000, 1),
+                         "last ms": round(values[-1][0] * 1000, 1), "bytes": int(sum(b for _, b in values) / len(values))})
+        return rows
+
+    def prometheus(self) -> str:
+        """The statistics in the Prometheus text format."""
+        with self._lock:
+            samples = {key: sorted(s for s, _ in values) for key, values in self._samples.items()}
+            totals = {key: list(values) for key, values in self._totals.items()}
+        lines = [
+            "# HELP dashboard_section_seconds Wall time of a page section per rerun, quantiles over the last reruns",
+            "# TYPE dashboard_section_seconds summary",
+        ]
+        for (page, section), seconds in samples.items():
+            labels = f'page="{page}",section="{section}"'
+            count, total, _ = totals[(page, section)]
+            for q in (0.5, 0.95):
+                lines.append(f'dashboard_section_seconds{{{labels},quantile="{q}"}} {quantile(seconds, q):.6f}')
+            lines.append(f"dashboard_section_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"dashboard_section_seconds_count{{{labels}}} {count}")
+        lines += ["# HELP dashboard_section_bytes_total Bytes sent to the browser by a page section",
+                  "# TYPE dashboard_section_bytes_total counter"]
+        for (page, section), (_, _, nbytes) in totals.items():
+            lines.append(f'dashboard_section_bytes_total{{page="{page}",section="{section}"}} {nbytes}')
+        lines += ["# HELP dashboard_resident_memory_bytes Resident memory of the process",
+                  "# TYPE dashboard_resident_memory_bytes gauge",
+                  f"dashboard_resident_memory_bytes {resident_bytes()}",
+                  "# HELP dashboard_active_sessions Sessions with a rerun in the last 5 minutes",
+                  "# TYPE dashboard_active_sessions gauge",
+                  f"dashboard_active_sessions {self.active_sessions()}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        # Written next to the target and renamed, a scraper never reads half a file
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(self.prometheus())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write {self.path}: {e}")
+
+
+@st.cache_resource
+def get_telemetry() -> Telemetry:
+    return Telemetry()
+
+
+def is_admin() -> bool:
+    return bool(st.session_state.get("authentication_status")) and st.session_state.get("name") == ADMIN_NAME
+
+
+def sidebar_panel(telemetry: Telemetry):
+    """Rerun timing per section, for the admin only."""
+    if not is_admin():
+        return
+    with st.sidebar.expander("Performance"):
+        st.write(f"**{resident_bytes() / 1e6:,.0f} MB** resident, **{telemetry.active_sessions()}** active sessions")
+        st.dataframe(telemetry.stats(), use_container_width=True, hide_index=True)
+        st.download_button("Prometheus metrics", telemetry.prometheus(), file_name="metrics.prom", mime="text/plain")
@@ -0,0 +1,50 @@
+from utils import charts
+from utils.applicant_search import ApplicantIndex
+from utils.build_aggregates import YEARLY_COUNTRIES
+from utils.concentration import ALL_AREAS, METRICS, build_concentration
+from utils.cube import build_cube
+from utils.focus_areas import FocusAreaIndex
+from utils.leaderboard import Leaderboard
+from utils.metrics import summarize
+from utils.ranking import RankingIndex
+
+# What a new visitor sees first: all years, Denmark selected, patents per 100.000 inhabitants
+DEFAULT_COUNTRY = "Denmark"
+DEFAULT_METRIC = "Patents/(inhabitants/100000)"
+
+
+def build_leaderboard(snapshot) -> Leaderboard:
+    return Leaderboard(snapshot["rådata"])
+
+
+def warm(snapshot):
+    """Builds what the main page derives on its first run, before the snapshot is swapped in.
+
+    The keys are the ones used by 📄_Patent_Applications.py, so the first rerun on the new
+    version only looks them up. Charts go into charts.cache for the default filters.
+    """
+    cube = snapshot.derived("cube", build_cube)
+    years = (int(cube.years[0]), int(cube.years[-1]))
+    summary = snapshot.derived(("summary", years), lambda d: summarize(cube, years))
+    ranking = snapshot.derived(("ranking", years), lambda d: RankingIndex(cube.map_frame(years), "country", ["Patents", DEFAULT_METRIC]))
+    yearly = snapshot.derived("yearly", lambda d: cube.yearly(YEARLY_COUNTRIES)).rename(columns={"person_ctry_code": "Country"})
+    focus_areas = snapshot.derived("focus_areas", lambda d: FocusAreaIndex(cube))
+    snapshot.derived("applicant_search", lambda d: ApplicantIndex(d.derived("leaderboard", build_leaderboard)))
+    concentration = snapshot.derived(("concentration", years), lambda d: build_concentration(d, years))
+    spread_ranking = snapshot.derived(("spread_ranking", ALL_AREAS, years),
+                                      lambda d: RankingIndex(concentration[concentration["Area"] == ALL_AREAS], "Country", list(METRICS)))
+
+    charts.cache.get((snapshot.version, "yearly"), charts.yearly, yearly)
+    if DEFAULT_COUNTRY not in summary["country_list"]:
+        return
+    focus_areas.breakdown(["Water"], True, DEFAULT_COUNTRY, years=years)
+    b = ranking.slice(DEFAULT_METRIC, DEFAULT_COUNTRY, k=89)
+    charts.cache.get((snapshot.version, "map", years, DEFAULT_METRIC, DEFAULT_COUNTRY), charts.choropleth, b, DEFAULT_METRIC)
+    b = ranking.slice(DEFAULT_METRIC, DEFAULT_COUNTRY, k=6)
+    b = b.assign(highlight=b["country"] == DEFAULT_COUNTRY)
+    charts.cache.get((snapshot.version, "top", years, DEFAULT_METRIC, DEFAULT_COUNTRY, DEFAULT_COUNTRY), charts.top_countries, b, DEFAULT_METRIC, years)
+    if DEFAULT_COUNTRY not in spread_ranking:
+        return  # no Danish applicant in this version
+    spread_df = spread_ranking.slice("Spread", DEFAULT_COUNTRY, k=6)
+    spread_df = spread_df[["Country", "Spread", "Applications", "Companies"]].assign(Highlight=spread_df["Country"] == DEFAULT_COUNTRY)
+    charts.cache.get((snapshot.version, "spread", years, "Spread", ALL_AREAS, DEFAULT_COUNTRY, DEFAULT_COUNTRY), charts.spread, spread_df, "Spread", ALL_AREAS)
@@ -1,37 +1,23 @@
 import streamlit as st
-import streamlit.components.v1 as components
-import streamlit_authenticator as stauth
-from streamlit_option_menu import option_menu
-from streamlit_extras.chart_container import chart_container
-
-
-import time
-from streamlit_js_eval import streamlit_js_eval, copy_to_clipboard, create_share_link, get_geolocation
 import pandas as pd
-import plotly.express as px
-import geopandas as gpd
-import altair as alt
-import matplotlib.pyplot as plt
-import numpy as np
-from collections import defaultdict
-from six import BytesIO
-from pyxlsb import open_workbook as open_xlsb
-import plotly.graph_objects as go
-import re
-import squarify
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 pd.options.mode.chained_assignment = None  # default='warn'
-
-#For login part (necsesary for streamlit_authenticator)
-import yaml
-from yaml import load, dump
-from yaml.loader import SafeLoader
+# The frames of utils.dataset_store are shared by every session of the worker, so nobody may modify them in place.
+# With copy-on-write (always on from pandas 3) a write in a session only ever touches a private copy.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 #To add logo
 from PIL import Image
 
+from utils.assets import get_asset
+from utils.credentials import Authenticator, get_credentials
+from utils.telemetry import get_telemetry, sidebar_panel
+
+LOGIN_ANIMATION = "./assets/connected_dots_viz.html"
+
 # Sets up Favicon, webpage title and layout
 favicon = Image.open(r"./assets/favicon.ico")
 
@@ -69,26 +55,15 @@ def add_logo():
     )
 add_logo()
 
-#To delete Admin page, when user is not admin
-from pathlib import Path
-from streamlit.source_util import (
-    page_icon_and_name, 
-    calc_md5, 
-    get_pages,
-    _on_pages_changed
-)
+# Wall time and bytes sent per section of this rerun, shown to the admin in the sidebar
+perf = get_telemetry().start("Patent Applications")
+perf.section("login")
 
-# Login menu in sidebar
-with open('./assets/config.yaml') as file:
-    config = yaml.load(file, Loader=SafeLoader)
+#To delete Admin page, when user is not admin
+from streamlit.source_util import get_pages, _on_pages_changed
 
-authenticator = stauth.Authenticate(
-    config['credentials'],
-    config['cookie']['name'],
-    config['cookie']['key'],
-    config['cookie']['expiry_days'],
-    config['preauthorized']
-)
+# Login menu in sidebar. Users are looked up in the credential store, which is shared by the whole process
+authenticator = Authenticator(get_credentials())
 
 name, authentication_status, username = authenticator.login('Login', 'sidebar')
 
@@ -112,23 +87,6 @@ def load_lottieurl(url: str):
         return None
     return r.json()
 
-def to_excel(df: pd.DataFrame):
-    output = BytesIO() 
-    writer = pd.ExcelWriter(output, engine='xlsxwriter') 
-    df.to_excel(writer, sheet_name='Sheet1') 
-    writer.close() 
-    processed_data = output.getvalue() 
-    return processed_data
-
-@st.cache_data
-
-def convert_excel(path, sheet_name = 'Ark1', pri = False):
-    df = pd.read_excel(path, sheet_name)
-    if pri:
-        print('The first 5 rows of the loaded data:')
-        # display_html(df.head())
-    return df
-
 def choose_headers(df, headers_list, pri):
     temp_df = pd.DataFrame()
     for i in range(len(headers_list)):
@@ -157,55 +115,79 @@ delete_page("📄 Patent Applications", "Admin")
 if st.session_state["authentication_status"] == None:
     st.sidebar.warning('Please enter your username and password 🔑')
 
-    #Particles vizualisation
-    with open(r"./assets/connected_dots_viz.html") as f: 
-        html_data = f.read()
-        browser_width = streamlit_js_eval(js_expressions='window.innerWidth', key = 'WIDTH')
-        st.components.v1.html(html_data, width=browser_width, height=775, scrolling=False)
+    #Particles vizualisation. Without a width the frame fills the page and the animation resizes with the window
+    st.components.v1.html(get_asset(LOGIN_ANIMATION).text, height=775, scrolling=False)
 
 #If user has tried loggin in, but has not entered correct credentials
 elif st.session_state["authentication_status"] == False:
     st.sidebar.error("Username/password is incorrect.")
-    #Particles vizualisation
-    with open(r"./assets/connected_dots_viz.html") as f: 
-        html_data = f.read()
-        browser_width = streamlit_js_eval(js_expressions='window.innerWidth', key = 'WIDTH')
-        st.components.v1.html(html_data, width=browser_width, height=775, scrolling=False)
+    #Particles vizualisation. Without a width the frame fills the page and the animation resizes with the window
+    st.components.v1.html(get_asset(LOGIN_ANIMATION).text, height=775, scrolling=False)
 
 #If user has logged in. 
 elif st.session_state["authentication_status"]:
+    perf.section("imports")
+    # The data and chart modules are only imported once logged in, so the login screen renders without them
+    import altair as alt
+    from streamlit_extras.chart_container import chart_container
+    from utils import charts
+    from utils.build_aggregates import YEARLY_COUNTRIES
+    from utils.cube import build_cube
+    from utils.dataset_store import get_store, session_id
+    from utils.exports import download_button
+    from utils.metrics import country_summary, summarize
+    from utils.focus_areas import AREA_COLUMN, FocusAreaIndex
+    from utils.leaderboard import PAGE_SIZE, Leaderboard
+    from utils.ranking import RankingIndex
+    from utils.applicant_search import ApplicantIndex
+    from utils.concentration import ALL_AREAS, METRICS, build_concentration
+
+    perf.section("data")
     st.header("Key metrics")
 
-    if "rådata" not in st.session_state:
-        st.session_state.rådata = convert_excel("./data/Miljøteknologi rådata_new2.xlsx", sheet_name="Sheet1", pri=False)
+    def build_leaderboard(d):
+        return Leaderboard(d["rådata"])
+
+    # One shared, read-only copy of the data per process, pinned by this session until its next rerun
+    data = get_store().acquire(session_id())
+    # Applications by country x year x focus area. The metrics, map, bars and lines below are all cut from it
+    cube = data.derived("cube", build_cube)
+
+    st.sidebar.write(f'Welcome 👋')
+    st.sidebar.write("Please proceed by setting the following filters:")
+    first_year, last_year = int(cube.years[0]), int(cube.years[-1])
+    years = st.sidebar.slider("Publication years", first_year, last_year, (first_year, last_year), key="year_range")
+    # Sums over any range come from cumulative sums, each range is summarized once per dataset version
+    perf.section("key metrics")
+    summary = data.derived(("summary", years), lambda d: summarize(cube, years))
+    denmark = country_summary(summary, "Denmark")
 
     col1, col2, col3, col4, col5 = st.columns(5)
 
     with col1:
-        st.metric("Patent applications", '{:,}'.format(len(st.session_state.rådata)).replace(',','.'))
-        st.metric("Patents within Water", '{:,}'.format((st.session_state.rådata["Vand"]).count()).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
+        st.metric("Patent applications", '{:,}'.format(summary["patents"]).replace(',','.'))
+        st.metric("Patents within Water", '{:,}'.format(summary["areas"]["Vand"]).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
 
     with col2:
-        st.metric("Countries included:", '{:,}'.format(len(st.session_state.rådata["person_ctry_code"].unique())).replace(',','.'), help="Specific countries has been excluded. This includes: Luxembourg, United States Virgin Islands, Monaco, Cook Islands, Liechtenstein, Cayman Islands")
-        st.metric("Patents within Climate adaptation", '{:,}'.format((st.session_state.rådata["Klimatilpasning"]).count()).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
+        st.metric("Countries included:", '{:,}'.format(summary["countries"]).replace(',','.'), help="Specific countries has been excluded. This includes: Luxembourg, United States Virgin Islands, Monaco, Cook Islands, Liechtenstein, Cayman Islands")
+        st.metric("Patents within Climate adaptation", '{:,}'.format(summary["areas"]["Klimatilpasning"]).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
     with col3:
-        st.metric("Patents applied for by Danish companies", '{:,}'.format((st.session_state.rådata["person_ctry_code"]=="Denmark").sum()).replace(',','.'))
-        st.metric("Patents within Waste, Ressources and Materials", '{:,}'.format((st.session_state.rådata["Affald"]).count()).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
+        st.metric("Patents applied for by Danish companies", '{:,}'.format(denmark["patents"]).replace(',','.'))
+        st.metric("Patents within Waste, Ressources and Materials", '{:,}'.format(summary["areas"]["Affald"]).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
 
     with col4:
-        st.metric("Number of companies", '{:,}'.format(len(st.session_state.rådata["psn_name"].unique())).replace(',','.'), help="The total number of unique companies applying for patents.")
-        st.metric("Patents within Air", '{:,}'.format((st.session_state.rådata["Luft"]).count()).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
+        st.metric("Number of companies", '{:,}'.format(summary["companies"]).replace(',','.'), help="The total number of unique companies applying for patents.")
+        st.metric("Patents within Air", '{:,}'.format(summary["areas"]["Luft"]).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
 
     with col5:
-        st.metric("Number of Danish companies:", '{:,}'.format(len(st.session_state.rådata[st.session_state.rådata["person_ctry_code"]=="Denmark"]["psn_name"].unique())).replace(',','.'), help="The number of unique danish companies applying for patents.")
-        st.metric("Patents within Nature",'{:,}'.format((st.session_state.rådata["Natur"]).count()).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
+        st.metric("Number of Danish companies:", '{:,}'.format(denmark["companies"]).replace(',','.'), help="The number of unique danish companies applying for patents.")
+        st.metric("Patents within Nature",'{:,}'.format(summary["areas"]["Natur"]).replace(',','.'), help="Some patent applications are counted within multiple environmental areas")
 
+    perf.section("filters")
     if "number_of_instances" not in st.session_state:
         st.session_state.number_of_instances = 10
     st.markdown("""---""")
 
-    st.sidebar.write(f'Welcome 👋')
-    st.sidebar.write("Please proceed by setting the following filters:")
     input1 = st.sidebar
     input2 = st.sidebar
     
@@ -218,7 +200,7 @@ elif st.session_state["authentication_status"]:
             with input2:
                 select_country = st.selectbox(
                 'Which country would you like to inspect?',
-                (list(st.session_state.rådata["person_ctry_code"].unique())), index=[i for i, x in enumerate(list(st.session_state.rådata["person_ctry_code"].unique()=="Denmark")) if x][0])
+                summary["country_list"], index=summary["country_list"].index("Denmark"))
         if not single_country:
             with input2:
                 st.session_state.number_of_instances = st.number_input('Choose the amount of top countries you would like to view:', value = st.session_state.number_of_instances, key="number_countries_input")
@@ -234,159 +216,66 @@ elif st.session_state["authentication_status"]:
     if not checked:
         x_values = "Patents"
 
-    if "patents_map" not in st.session_state:
-        st.session_state.patents_map = convert_excel("data/patents_all_map2.xlsx", sheet_name = "Sheet1")
+    perf.section("map")
+    # Countries are pre-sorted by both metrics once per dataset version, a slice is a rank lookup
+    ranking = data.derived(("ranking", years), lambda d: RankingIndex(cube.map_frame(years), "country", ["Patents", "Patents/(inhabitants/100000)"]))
+    focus_country = select_country if single_country else None
+    highlight_country = select_country if single_country else "Denmark"
 
-    b = st.session_state.patents_map
-    b = b.sort_values(by=x_values, ascending=False)
-    b.reset_index(drop=True, inplace=True)
-    if single_country:
-        mark = b[b["country"]==select_country].index[0]+89
-    if not single_country:
-        mark = st.session_state.number_of_instances
-
-    fig2 = go.Figure(data=go.Choropleth(
-        locations = b[:mark]['ISO_3_alpha'],
-        z = b[:mark][x_values],
-        text = b[:mark]['country'],
-        colorscale = 'algae',
-        autocolorscale=False,
-        reversescale=False,
-        marker_line_color='darkgray',
-        marker_line_width=0.5,
-        colorbar_title = "No. of Patents",
-    ))
-    fig2.update_geos(scope="world", visible=False, resolution=50, showcountries=True, lataxis_showgrid=False, lonaxis_showgrid=False)
-    fig2.update_layout(
-        title_text='Patent applications of countries mapped',
-        margin=dict(l=0, r=0, b=0, t=25),
-        height=625,
-        geo=dict(
-            showframe=False,
-            showcoastlines=True,
-        ),
-        geo_bgcolor="#0E1117"
-    )
-    st.plotly_chart(fig2, use_container_width=True, sharing="streamlit", theme="streamlit")
+    b = ranking.slice(x_values, focus_country, k=89, n=st.session_state.number_of_instances)
+
+    # Charts are cached by dataset version, metric, slice and highlighted country
+    slice_key = focus_country if single_country else st.session_state.number_of_instances
+    fig2_key = (data.version, "map", years, x_values, slice_key)
+    fig2 = charts.cache.get(fig2_key, charts.choropleth, b, x_values)
+    with charts.cache.render("map", fig2_key):
+        st.plotly_chart(fig2, use_container_width=True, sharing="streamlit", theme="streamlit")
 
     st.text(" ")
     st.text(" ")
 
-    if single_country:
-        mark = b[b["country"]==select_country].index[0]+6
-        b['highlight'] = b['country'].apply(lambda x: x == select_country)
-    if not single_country:
-        mark = st.session_state.number_of_instances
-        b['highlight'] = b['country'].apply(lambda x: x == "Denmark")
-
-    patents = alt.Chart(b[:mark]).mark_bar().encode(
-        y = alt.Y("country:N",sort='-x'),
-        x = alt.X(x_values+":Q"),
-        color=alt.condition(
-        alt.datum.highlight,
-        alt.value('#367366'),
-        alt.value('#85C7A6')),
-        tooltip=['country', x_values+":Q"]
-    ).properties(
-        title="Top countries applying for environmental tachnology patents (2011-2022)"
-    )
+    perf.section("top countries")
+    b = ranking.slice(x_values, focus_country, k=6, n=st.session_state.number_of_instances)
+    b = b.assign(highlight=b["country"] == highlight_country)
 
-    with chart_container(data=b[:mark], export_formats = (["CSV"])):
-        st.altair_chart(patents, use_container_width=True)
+    patents_key = (data.version, "top", years, x_values, slice_key, highlight_country)
+    patents = charts.cache.get(patents_key, charts.top_countries, b, x_values, years)
 
-    st.write(" ")
+    with chart_container(data=b, export_formats = (["CSV"])):
+        with charts.cache.render("top countries", patents_key):
+            st.altair_chart(patents, use_container_width=True)
 
+    st.write(" ")
 
-    top_15_grouped_normed = convert_excel("./data/Yearly_change_plot_patents.xlsx", sheet_name="Sheet1")
-    top_15_grouped_normed = top_15_grouped_normed.rename(columns={"person_ctry_code":"Country"})
-    chart10 = alt.Chart(top_15_grouped_normed).mark_line().encode(
-        x=alt.X('earliest_publn_year:O', axis=alt.Axis(title='Year')),
-        y=alt.Y('patents_normed:Q'),
-        color=alt.Color('Country:N', legend=alt.Legend(title='Country')),
-        tooltip=["Country:N"]
-    ).properties(
-        title="Yearly development in amount of applications for a preselected set of countries"
-    ).transform_calculate(tt="datum.x+' value'")
 
-    tt = chart10.mark_line(strokeWidth=30, opacity=0.01)
-    chart10 = chart10 + tt
+    perf.section("yearly")
+    top_15_grouped_normed = data.derived("yearly", lambda d: cube.yearly(YEARLY_COUNTRIES)).rename(columns={"person_ctry_code":"Country"})
+    chart10_key = (data.version, "yearly")
+    chart10 = charts.cache.get(chart10_key, charts.yearly, top_15_grouped_normed)
 
     with chart_container(data=top_15_grouped_normed, export_formats = (["CSV"])):
-        st.altair_chart(chart10, use_container_width=True)
+        with charts.cache.render("yearly", chart10_key):
+            st.altair_chart(chart10, use_container_width=True)
 
     st.write(" ")
     st.write(" ")
     
-    # Teknikområde opdeling:
-    if "tech_normed" not in st.session_state:
-        st.session_state.tech_normed = convert_excel("./data/teknikområde_opdelinger_normed.xlsx", sheet_name="Sheet1")
-        st.session_state.tech_normed = st.session_state.tech_normed.rename(columns={"Natur": "Nature", "Luft": "Air", "Vand": "Water", "Klimatilpasning": "Climate", "Affald": "Waste, Resources & Materials"})
-        st.session_state.tech_normed.drop(st.session_state.tech_normed[st.session_state.tech_normed["country"]=="Cayman Islands"].index, axis=0, inplace=True)
-        
-    if "tech" not in st.session_state:
-        st.session_state.tech = convert_excel("./data/teknikområde_opdelinger.xlsx", sheet_name="Sheet1")
-        st.session_state.tech = st.session_state.tech.rename(columns={"Natur": "Nature", "Luft": "Air", "Vand": "Water", "Klimatilpasning": "Climate", "Affald": "Waste, Resources & Materials"})
-        st.session_state.tech.drop(st.session_state.tech[st.session_state.tech["country"]=="Cayman Islands"].index, axis=0, inplace=True)
-    
-    if checked:
-        x = st.session_state.tech_normed
-    if not checked:
-        x = st.session_state.tech
+    perf.section("focus areas")
+    # Teknikområde opdeling, any subset of areas is summed from the cube. The slices are memoized per dataset version.
+    focus_areas = data.derived("focus_areas", lambda d: FocusAreaIndex(cube))
 
     options = st.multiselect(
     'Select one or more subareas to view distribution of patents:',
     ['Water', 'Air', 'Waste, Resources & Materials', 'Climate', 'Nature'],
     ['Water'])
 
+    # An empty multiselect keeps showing the last selection
     if "selected_tech" not in st.session_state:
         st.session_state.selected_tech = []
-
-    def onclick():
-        x_temp = x[st.session_state.selected_tech]
-        x_temp["sum"] = x_temp.sum(axis=1)
-        x_temp["country"] = x["country"]
-        x_temp = x_temp.sort_values(by="sum", ascending=False)
-        x_temp.reset_index(drop=True, inplace=True)
-        if single_country:
-            mark2 = x_temp[x_temp["country"]==select_country].index[0]+6
-        if not single_country:
-            mark2 = st.session_state.number_of_instances
-        top_k = list(x_temp["country"][:mark2])
-        x_temp = x_temp.drop("sum", axis=1)
-        x_temp = x_temp.melt(id_vars=['country'], var_name='tech', value_name='patents')
-        x_temp = x_temp[x_temp["country"].isin(top_k)]
-        x_temp["country"] = x_temp['country'].str.strip()
-        x_temp['order'] = x_temp['tech'].replace({val: i for i, val in enumerate(['Nature', 'Air', 'Water', 'Climate', "Waste, Resources & Materials"])})
-        return x_temp
-
-    altered_x = onclick()
-
     if options:
-        if "Water" not in st.session_state.selected_tech and "Water" in options:
-            st.session_state.selected_tech.append("Water")
-        elif "Water" in st.session_state.selected_tech and "Water" not in options:
-            st.session_state.selected_tech.remove("Water")
-
-        if "Air" not in st.session_state.selected_tech and "Air" in options:
-            st.session_state.selected_tech.append("Air")
-        elif "Air" in st.session_state.selected_tech and "Air" not in options:
-            st.session_state.selected_tech.remove("Air")
-
-        if "Waste, Resources & Materials" not in st.session_state.selected_tech and "Waste, Resources & Materials" in options:
-            st.session_state.selected_tech.append("Waste, Resources & Materials")
-        elif "Waste, Resources & Materials" in st.session_state.selected_tech and "Waste, Resources & Materials" not in options:
-            st.session_state.selected_tech.remove("Waste, Resources & Materials")
-
-        if "Climate" not in st.session_state.selected_tech and "Climate" in options:
-            st.session_state.selected_tech.append("Climate")
-        elif "Climate" in st.session_state.selected_tech and "Climate" not in options:
-            st.session_state.selected_tech.remove("Climate")
-
-        if "Nature" not in st.session_state.selected_tech and "Nature" in options:
-            st.session_state.selected_tech.append("Nature")
-        elif "Nature" in st.session_state.selected_tech and "Nature" not in options:
-            st.session_state.selected_tech.remove("Nature")
-        altered_x = onclick()
+        st.session_state.selected_tech = list(options)
+
+    altered_x = focus_areas.breakdown(st.session_state.selected_tech, checked, focus_country, k=6, n=st.session_state.number_of_instances, years=years)
 
     color_scale = alt.Scale(domain=['Nature', 'Air', 'Water', 'Climate', 'Waste, Resources & Materials'],
                     range=['#FF5300', '#FCAA00', '#293972', '#5D9BA8', '#85C7A6'])
@@ -425,52 +314,59 @@ elif st.session_state["authentication_status"]:
     if single_country:
         st.altair_chart(tech_chart, use_container_width=True)
         altered_x = altered_x.drop(["order"], axis=1)
-        if st.download_button(
-            label="Download data (.xlsx)",
-            data = to_excel(altered_x),
-            file_name="CLEAN_Patents_FocusAreas_"+select_country+".xlsx",
-            key='tech-data',
-        ): st.toast('Data was sucessfully exported', icon='✅')
+        if download_button(altered_x, "Download data", "CLEAN_Patents_FocusAreas_"+select_country, key='tech-data'):
+            st.toast('Data was sucessfully exported', icon='✅')
 
     if not single_country:
         st.altair_chart(tech_chart, use_container_width=True)
         altered_x = altered_x.drop(["order"], axis=1)
-        st.download_button(
-            label="Download data (.xlsx)",
-            data = to_excel(altered_x),
-            file_name="CLEAN_Patents_FocusAreas.xlsx",
-            key='tech-data',
-        )
+        download_button(altered_x, "Download data", "CLEAN_Patents_FocusAreas", key='tech-data')
 
+    # The bars add up the areas, so an application in several selected areas is counted more than once.
+    # The exact figures are looked up in the cube's tables of area combinations.
+    area_columns = [AREA_COLUMN[area] for area in st.session_state.selected_tech]
+    counted_in = [cube.index(select_country)] if single_country else cube.included
+    counted_for = select_country if single_country else "all countries"
+    sum1, sum2, sum3 = st.columns(3)
+    with sum1:
+        st.metric(f"Sum of areas, {counted_for}", '{:,}'.format(int(cube.patents(years, area_columns)[counted_in].sum())).replace(',','.'), help="As in the chart: an application in several of the selected areas is counted once per area")
+    with sum2:
+        st.metric("Distinct applications", '{:,}'.format(int(cube.distinct(years, area_columns)[counted_in].sum())).replace(',','.'), help="Applications in at least one of the selected areas, each counted once")
+    with sum3:
+        st.metric("In all selected areas", '{:,}'.format(int(cube.distinct(years, area_columns, "all")[counted_in].sum())).replace(',','.'), help="Applications that belong to every selected area")
 
 
 
+
+    perf.section("companies")
     if single_country:
         st.markdown("""---""")
         st.header("The companies")
         arr1, arr2 = st.columns(2)
         with arr1:
-            amount_companies = '{:,}'.format(len(st.session_state.rådata[st.session_state.rådata["person_ctry_code"] == str(select_country)]["psn_name"].unique())).replace(',','.')
-            amount_patents = '{:,}'.format((st.session_state.rådata["person_ctry_code"]==str(select_country)).sum()).replace(',','.')
+            selected = country_summary(summary, select_country)
+            amount_companies = '{:,}'.format(selected["companies"]).replace(',','.')
+            amount_patents = '{:,}'.format(selected["patents"]).replace(',','.')
             
-            amount_pantents_per_100000_inhabitats = st.session_state.patents_map.loc[st.session_state.patents_map['country'] == str(select_country), 'Patents/(inhabitants/100000)'].item()
-            amount_pantents_per_100000_inhabitats_rounded = round(amount_pantents_per_100000_inhabitats, 2)
+            amount_pantents_per_100000_inhabitats = selected["per_100k"]
             
-            st.write(f'The **{amount_companies}** companies of **{select_country}** has applied for a total of **{amount_patents} patents** related to environmental technology during 2011-2021.')
-            st.write(f'That is **{amount_pantents_per_100000_inhabitats_rounded}** patent applications / 100.000 inhabitants.')
-            st.session_state.number_of_companies = st.number_input('How many companies would you like to view?', value = 10, key="number_companies_input")
-            if "companies" not in st.session_state:
-                st.session_state.companies = st.session_state.rådata.groupby(["person_ctry_code", "psn_name"]).size()
-            companies = st.session_state.companies.loc[select_country].sort_values(ascending=False)[0:st.session_state.number_of_companies].reset_index()
-            companies = companies.rename(columns={0:"patents"})
-            companies = companies.rename(columns={"psn_name":"company"})
-            edited_comp = st.data_editor(companies, use_container_width=True)
-            if st.download_button(
-            "Download data (.xlsx)", 
-            to_excel(edited_comp),
-            "company_data_"+select_country+".xlsx", 
-            use_container_width=True
-            ): st.toast('Data was sucessfully exported', icon='✅')
+            st.write(f'The **{amount_companies}** companies of **{select_country}** has applied for a total of **{amount_patents} patents** related to environmental technology during {years[0]}-{years[1]}.')
+            # None when the population of the country is unknown
+            if amount_pantents_per_100000_inhabitats is not None:
+                amount_pantents_per_100000_inhabitats_rounded = round(amount_pantents_per_100000_inhabitats, 2)
+                st.write(f'That is **{amount_pantents_per_100000_inhabitats_rounded}** patent applications / 100.000 inhabitants.')
+            # Counts per year of every applicant, built once per dataset version. Only the selected country is ranked for the years and only one page is sent to the browser
+            leaderboard = data.derived("leaderboard", build_leaderboard)
+            total_companies = leaderboard.total(select_country, years)
+            page = st.number_input('Page', min_value=1, max_value=leaderboard.pages(select_country, years), value=1, step=1, key="companies_page_"+select_country)
+            companies = leaderboard.page(select_country, page, years)
+            first_shown = (page - 1) * PAGE_SIZE + 1
+            st.caption(f'Showing {first_shown:,}–{first_shown + len(companies) - 1:,} of {total_companies:,} companies'.replace(',','.') + f' in {years[0]}-{years[1]}')
+            st.data_editor(companies.set_index("rank"), use_container_width=True)
+            # The download has the full list of the country, not only the page shown. It is only built when asked for
+            if download_button(lambda: leaderboard.country_frame(select_country, years).set_index("rank"), "Download data", f"company_data_{select_country}_{years[0]}-{years[1]}",
+                               key="company-data", cache_key=(data.version, "companies", select_country, years), use_container_width=True):
+                st.toast('Data was sucessfully exported', icon='✅')
         with arr2:
             st.write(" ")
             st.write(" ")
@@ -488,36 +384,51 @@ elif st.session_state["authentication_status"]:
             st.write("- **Column sorting:** Sort columns by clicking on their headers.")
             st.write("- **Search:** Search through data by clicking a table, using hotkeys (⌘ Cmd + F or Ctrl + F) to bring up the search bar, and using the search bar to filter data.")
             st.write("- **Copy to clipboard:** Select one or multiple cells, copy them to the clipboard and paste them into your favorite spreadsheet software.")
-            
 
-    spread_df = convert_excel("./data/spread_data.xlsx", sheet_name="Sheet1")
-    if single_country:
-        mark3 = spread_df[spread_df["Country"]==select_country].index[0]+6
-        spread_df['Highlight'] = spread_df['Country'].apply(lambda x: x == select_country)
-
-    if not single_country:
-        mark3 = st.session_state.number_of_instances
-        spread_df['Highlight'] = spread_df['Country'].apply(lambda x: x == "Denmark")
-
-    chart2 = alt.Chart(spread_df[:mark3]).mark_bar().encode(
-        y = alt.Y("Country:N",sort='-x'),
-        x = alt.X("Spread:Q", axis=alt.Axis(title="Spred (total no. of companies/country / total no. of patent applications)")),
-        color=alt.condition(
-        alt.datum.Highlight,
-        alt.value('#367366'),
-        alt.value('#85C7A6')),
-        tooltip=["Country:N", "Spread:Q"]
-    ).properties(
-        title="Spread of patents across a country's companies"
-    )
+    perf.section("company search")
+    st.subheader("Find a company")
+    query = st.text_input("Search for a company in all countries and years", key="company_search", placeholder="Start of the name, or any part of it")
+    if query.strip():
+        # Name index (sorted names + trigrams) over the applicants of every country and year, built once per dataset version
+        applicants = data.derived("applicant_search", lambda d: ApplicantIndex(d.derived("leaderboard", build_leaderboard)))
+        matches = applicants.search(query)
+        if matches.empty:
+            st.info(f'No company matches "{query}"')
+        else:
+            st.dataframe(matches, use_container_width=True, hide_index=True, column_config={"rank": "rank in country", "patents": "patents, all years"})
+
+    perf.section("spread")
+    # Concentration of each country's applications on its companies in the selected years, computed from the raw data once per dataset version and year range.
+    # Only a few rows per country, so keeping every range is cheap
+    spread1, spread2 = st.columns(2)
+    with spread1:
+        spread_metric = st.selectbox("Concentration measure", list(METRICS), key="spread_metric")
+    with spread2:
+        spread_area = st.selectbox("Focus area", [ALL_AREAS] + list(AREA_COLUMN), key="spread_area")
+    concentration = data.derived(("concentration", years), lambda d: build_concentration(d, years))
+    spread_ranking = data.derived(("spread_ranking", spread_area, years),
+                                  lambda d: RankingIndex(concentration[concentration["Area"] == spread_area], "Country", list(METRICS)))
+    # A country without any named applicant has no concentration, the top countries are shown instead
+    spread_focus = focus_country if focus_country in spread_ranking else None
+    spread_df = spread_ranking.slice(spread_metric, spread_focus, k=6, n=st.session_state.number_of_instances)
+    spread_df = spread_df[["Country", spread_metric, "Applications", "Companies"]].assign(Highlight=spread_df["Country"] == highlight_country)
+
+    spread_key = spread_focus if spread_focus is not None else st.session_state.number_of_instances
+    chart2_key = (data.version, "spread", years, spread_metric, spread_area, spread_key, highlight_country)
+    chart2 = charts.cache.get(chart2_key, charts.spread, spread_df, spread_metric, spread_area)
 
     st.write(" ")
     st.write(" ")
 
     # Display chart in Streamlit
-    with chart_container(data=spread_df[:mark3], export_formats = (["CSV"])):
-        st.altair_chart(chart2, use_container_width=True)
+    with chart_container(data=spread_df, export_formats = (["CSV"])):
+        with charts.cache.render("spread", chart2_key):
+            st.altair_chart(chart2, use_container_width=True)
 
     st.markdown("""---""")
 
-    #st.header("Yearly development in amount of applications")  
\ No newline at end of file
+    #st.header("Yearly development in amount of applications")  
+
+perf.section("performance panel")
+sidebar_panel(get_telemetry())
+perf.finish()